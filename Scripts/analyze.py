@@ -0,0 +1,740 @@
+import argparse
+import collections
+import os
+import shlex
+import sys
+
+import billiards
+import checkpoint
+import coverage
+import dedup
+import follow
+import pathforms
+import pathstats
+import probability
+import regions
+import store
+import swiftdata
+
+# Command line front end for the path analyses in this directory, e.g.:
+#
+#   python analyze.py stats Data/run1.success.csv Data/run2.success.csv
+#   python analyze.py winding Data/paths-*.txt
+#   python analyze.py distinct --memory-limit 64 Data/paths-*.txt
+#   python analyze.py family --checkpoint stats.json Data/*.success.csv
+#   python analyze.py store-ingest results.db Data/*.csv
+#   python analyze.py swift-cycles data/cycleset/run7
+#   python analyze.py convert --from counts --to turns families.txt
+#   python analyze.py batch jobs.txt
+#
+# Every subcommand accepts any number of input files. Caches (count forms of
+# edge paths, PathStudy instances) live for the whole process, so running
+# several jobs in one invocation -- in particular through "batch", which reads
+# one subcommand per line -- only pays for each distinct path once.
+
+def EdgePathsInFile(filename):
+  with open(filename) as f:
+    for line in f:
+      # Accept both plain path lists and the search result CSVs, where the
+      # path is the third column.
+      fields = line.split(",")
+      edgePath = billiards.CleanEdgePath(
+          fields[2] if len(fields) > 2 else fields[0])
+      if len(edgePath) > 0:
+        yield edgePath
+
+# Yields the stripped non-empty lines of filename, or of standard input for
+# "-".
+def NonEmptyLines(filename):
+  f = sys.stdin if filename == "-" else open(filename)
+  try:
+    for line in f:
+      line = line.strip()
+      if len(line) > 0:
+        yield line
+  finally:
+    if f is not sys.stdin:
+      f.close()
+
+def IsCsvFile(filename):
+  return filename.endswith(".csv")
+
+canonicalCache = {}
+
+def CachedCanonicalEdgePath(edgePath):
+  canonical = canonicalCache.get(edgePath)
+  if canonical is None:
+    if len(canonicalCache) >= billiards.countsCacheLimit:
+      canonicalCache.clear()
+    canonical = billiards.CanonicalizeEdgePath(edgePath)
+    canonicalCache[edgePath] = canonical
+  return canonical
+
+# A PathStudy keeps everything it builds (spine, boundary vertices, fan
+# runs), so only the studyCacheLimit most recently used ones are kept.
+studyCacheLimit = 256
+studyCache = collections.OrderedDict()
+
+def CachedPathStudy(edgePath):
+  canonical = CachedCanonicalEdgePath(edgePath)
+  study = studyCache.pop(canonical, None)
+  if study is None:
+    study = billiards.PathStudy(canonical)
+    if len(studyCache) >= studyCacheLimit:
+      studyCache.popitem(False)
+  studyCache[canonical] = study
+  return study
+
+# With checkpointFile, starts from the PathStats saved there (if it exists),
+# reads only what was appended to the files since, and saves the result back.
+# keepCoords says whether every data point is needed, rather than just the
+# per-path summaries (see billiards.CoordsSummary); a new checkpoint only
+# saves them if it is set.
+def AddFilesToPathStats(
+    filenames, mirror=False, checkpointFile=None, keepCoords=False):
+  if checkpointFile is not None:
+    if os.path.exists(checkpointFile):
+      cp = checkpoint.LoadPathStatsCheckpoint(checkpointFile)
+      if cp.mirror != mirror:
+        raise ValueError(
+            checkpointFile + " was built " + ("with" if cp.mirror else
+            "without") + " --mirror")
+      if keepCoords and not billiards.keepAllCoords:
+        raise ValueError(
+            checkpointFile + " only has coords summaries, not every point "
+            "(rebuild it with --keep-coords)")
+    else:
+      billiards.ResetPathStats(keepCoords)
+      cp = checkpoint.PathStatsCheckpoint(mirror)
+    for filename in filenames:
+      cp.addFile(filename)
+    cp.save(checkpointFile)
+    return
+  billiards.ResetPathStats(keepCoords)
+  for filename in filenames:
+    if IsCsvFile(filename):
+      billiards.AddCsvFileToPathStats(filename, mirror)
+    else:
+      billiards.AddTextFileToPathStats(filename, mirror)
+
+# Per-point rows need every data point; checkpoints only save them with
+# --keep-coords.
+def RunStats(args):
+  keepCoords = not (args.summary or args.coords)
+  if args.checkpoint is not None:
+    if keepCoords and not args.keep_coords:
+      raise ValueError(
+          "per-point rows from a checkpoint need --keep-coords")
+    keepCoords = args.keep_coords
+  AddFilesToPathStats(args.files, args.mirror, args.checkpoint, keepCoords)
+  if args.summary:
+    billiards.PrintPathStatsSummary()
+  elif args.coords:
+    billiards.PrintPathStatsCoordsSummary()
+  else:
+    billiards.PrintPathStatsCsv()
+
+# The canonical edge path, or with counts the count form string, of edgePath;
+# with mirror, paths and their mirror images get the same key.
+def CanonicalKeyForEdgePath(edgePath, counts=False, mirror=False):
+  if counts and mirror:
+    counts = billiards.CachedSymmetricCountsForEdgePath(edgePath)[0]
+    return str(billiards.PathCountForm(counts))
+  if counts:
+    return str(billiards.PathCountForm(
+        billiards.CachedCountsForEdgePath(edgePath)))
+  if mirror:
+    return billiards.SymmetricCanonicalEdgePath(
+        CachedCanonicalEdgePath(edgePath))[0]
+  return CachedCanonicalEdgePath(edgePath)
+
+def RunCanonicalize(args):
+  for filename in args.files:
+    for edgePath in EdgePathsInFile(filename):
+      print(CanonicalKeyForEdgePath(edgePath, args.counts, args.mirror))
+
+# Prints one key,multiplicity row per distinct canonical path (or count form)
+# in the input files, sorted by key, and the distinct and total counts to
+# stderr. Counts are exact however large the corpus: past --memory-limit
+# megabytes they are spilled to sorted runs on disk and merged at the end.
+def RunDistinct(args):
+  counter = dedup.ExternalCounter(
+      int(args.memory_limit * (1 << 20)), args.temp_dir)
+  try:
+    for filename in args.files:
+      for edgePath in EdgePathsInFile(filename):
+        counter.add(CanonicalKeyForEdgePath(
+            edgePath, args.counts, args.mirror))
+    distinct = 0
+    total = 0
+    for (key, count) in counter.items():
+      print(key + "," + str(count))
+      distinct += 1
+      total += count
+  finally:
+    counter.close()
+  sys.stderr.write(
+      str(distinct) + " distinct paths, " + str(total) + " total\n")
+
+# Prints each minimal count form together with the number of data points of
+# its whole family (itself and every multiple of it).
+def RunFamily(args):
+  AddFilesToPathStats(args.files, args.mirror, args.checkpoint, False)
+  families = [ps for ps in billiards.allPathStats if ps.ancestor is None]
+  families.sort(
+      key=lambda ps: ps.dataPoints + ps.descendantDataPoints, reverse=True)
+  for ps in families:
+    print(ps.pathStr + "," + str(ps.dataPoints + ps.descendantDataPoints))
+
+# Combines checkpoints of disjoint inputs (e.g. from different machines)
+# into one.
+def RunCheckpointMerge(args):
+  first = checkpoint.ReadCheckpoint(args.inputs[0])
+  billiards.ResetPathStats(first["keepCoords"])
+  cp = checkpoint.PathStatsCheckpoint(first["mirror"])
+  cp.merge(first)
+  for filename in args.inputs[1:]:
+    cp.merge(checkpoint.ReadCheckpoint(filename))
+  cp.save(args.output)
+
+def RunWinding(args):
+  stats = {}
+  if args.memory_limit is not None:
+    stats["paths"] = dedup.ExternalCounter(
+        int(args.memory_limit * (1 << 20)), args.temp_dir)
+  try:
+    for filename in args.files:
+      pathstats.AddWindingStatsForFile(filename, stats)
+    pathstats.PrintWindingStats(stats)
+  finally:
+    if args.memory_limit is not None:
+      stats["paths"].close()
+
+# Evaluates the constraints of each path on a grid of apexes and prints
+# x,y,path,value rows, where value is either the given (left, right)
+# constraint or the minimum over all of them (positive iff the path is
+# feasible at that apex). With --active, the pairs that can be minimal
+# anywhere in the grid are found first and only those are evaluated; with
+# --signs, only the (exactly decided) sign of the value is printed; with
+# --fans, the minimum is found fan by fan (see fanFeasibilityMargin), in
+# unnormalized units. With --mirror and --signs (on a grid symmetric about
+# x = 1/2), only apexes with x <= 1/2 are evaluated: a path is feasible at
+# (x, y) exactly when its mirror image is at (1 - x, y), so a symmetric path,
+# or a path listed together with its mirror, costs half as much. The left
+# half of the grid is then laid out as the exact mirror image of the right
+# half (1 - x is exact for x >= 1/2), so its x coordinates can be an ulp off
+# those of a plain sweep. Only the sign carries over: the mirror can be
+# canonicalized from a different base edge, and then its values are in
+# different units (see PathGeometryRing) and its extremal pair differs.
+def RunConstraintSweep(args):
+  edgePaths = list(args.paths)
+  for filename in args.path_files:
+    edgePaths.extend(EdgePathsInFile(filename))
+  steps = max(args.steps, 1)
+  region = (args.xmin, args.xmax, args.ymin, args.ymax)
+  mirror = args.mirror and args.signs and not args.pair and (
+      abs(args.xmin + args.xmax - 1) < 1e-12)
+  if args.mirror and not mirror:
+    sys.stderr.write(
+        "--mirror needs --signs, no --pair and a grid symmetric about "
+        "x = 1/2; evaluating every apex\n")
+
+  activePairs = {}
+  def activeConstraints(study):
+    if study.path not in activePairs:
+      (leftIndices, rightIndices, certified) = study.activeConstraints(region)
+      sys.stderr.write(
+          study.path + ": active left " + str(leftIndices) + " of " +
+          str(len(study.leftVertices)) + ", right " + str(rightIndices) +
+          " of " + str(len(study.rightVertices)) +
+          (" (certified)\n" if certified else " (sampled)\n"))
+      activePairs[study.path] = (leftIndices, rightIndices)
+    return activePairs[study.path]
+
+  def gridApex(i, j):
+    if mirror and 2 * i < steps:
+      x = 1 - gridApex(steps - i, j).x
+    else:
+      x = args.xmin + (args.xmax - args.xmin) * i / float(steps)
+    y = args.ymin + (args.ymax - args.ymin) * j / float(steps)
+    return billiards.Coords2d(x, y)
+
+  def evaluate(study, apex):
+    if args.signs:
+      if args.pair:
+        return study.constraintSign(apex, args.pair[0], args.pair[1])
+      return study.feasibilitySign(apex)
+    if args.pair:
+      constraint = study.constraintFunctions(apex)
+      return constraint(args.pair[0], args.pair[1])
+    if args.fans:
+      return study.fanFeasibilityMargin(apex)[0]
+    if args.active:
+      (leftIndices, rightIndices) = activeConstraints(study)
+      return study.feasibilityMarginForPairs(
+          apex, leftIndices, rightIndices)[0]
+    return study.feasibilityMargin(apex)[0]
+
+  # (path, x, y) -> sign, for the left half of the grid when mirroring.
+  values = {}
+  def valueAt(study, i, j):
+    apex = gridApex(i, j)
+    if not mirror:
+      return evaluate(study, apex)
+    if apex.x > 0.5:
+      study = CachedPathStudy(billiards.MirrorEdgePath(study.path))
+      apex = billiards.Coords2d(1 - apex.x, apex.y)
+    key = (study.path, apex.x, apex.y)
+    value = values.get(key)
+    if value is None:
+      value = evaluate(study, apex)
+      values[key] = value
+    return value
+
+  for edgePath in edgePaths:
+    study = CachedPathStudy(edgePath)
+    if args.active and not mirror:
+      activeConstraints(study)
+    for i in range(steps + 1):
+      for j in range(steps + 1):
+        apex = gridApex(i, j)
+        value = valueAt(study, i, j)
+        print(str(apex.x) + "," + str(apex.y) + "," + study.path + "," +
+            str(value))
+  if args.signs:
+    sys.stderr.write(str(billiards.signFilterStats) + "\n")
+
+# Prints k,x,y,margin for members k = --first..--last of the family of PATH
+# whose run i is lengthened by INCREMENTS[i] * k turns (see PathFamily), at
+# every apex given with --apex.
+def RunFamilySweep(args):
+  family = billiards.PathFamily(args.path, args.increments)
+  apexes = [billiards.Coords2d(x, y) for (x, y) in args.apexes]
+  margins = family.feasibilityMargins(apexes, args.first, args.last)
+  for (k, memberMargins) in zip(range(args.first, args.last + 1), margins):
+    for (apex, margin) in zip(apexes, memberMargins):
+      print(",".join([
+          str(k), str(apex.x), str(apex.y),
+          "" if margin is None else str(margin)]))
+
+# Prints path,margin for every path in the files that is feasible at the
+# apex, sharing one table of rotation powers across the whole corpus.
+def RunScreen(args):
+  edgePaths = []
+  seen = set()
+  for filename in args.files:
+    for edgePath in EdgePathsInFile(filename):
+      canonical = CachedCanonicalEdgePath(edgePath)
+      if canonical not in seen:
+        seen.add(canonical)
+        edgePaths.append(canonical)
+  apex = billiards.Coords2d(args.x, args.y)
+  if args.processes > 1:
+    results = billiards.ScreenEdgePathsAtApex(edgePaths, apex, args.processes)
+  else:
+    studies = [CachedPathStudy(edgePath) for edgePath in edgePaths]
+    results = [
+        (study.path, margin)
+        for (study, margin) in billiards.ScreenPathStudiesAtApex(
+            studies, apex)]
+  for (edgePath, margin) in results:
+    print(edgePath + "," + str(margin))
+  sys.stderr.write(
+      str(len(results)) + " of " + str(len(edgePaths)) + " paths feasible\n")
+
+# Prints path,curve,x,y rows for the boundary curves of each path's feasible
+# region (or of one --pair constraint) in the given region of the apex
+# domain, numbering the curves of each path from 0. Closed curves end with a
+# copy of their first point; open ones end on the region's boundary, unless
+# --closed joins them along it into polygons.
+def RunTrace(args):
+  edgePaths = list(args.paths)
+  for filename in args.path_files:
+    edgePaths.extend(EdgePathsInFile(filename))
+  region = (args.xmin, args.xmax, args.ymin, args.ymax)
+  for edgePath in edgePaths:
+    study = CachedPathStudy(edgePath)
+    if args.pair:
+      f = regions.ConstraintFunction(study, args.pair[0], args.pair[1])
+    else:
+      f = regions.FeasibilityMarginFunction(study)
+    if args.closed:
+      curves = [
+          (points, True) for points in regions.RegionPolygons(
+              f, region, args.steps, args.tolerance)]
+    else:
+      curves = regions.TraceZeroSet(f, region, args.steps, args.tolerance)
+    for (index, (points, closed)) in enumerate(curves):
+      if closed:
+        points = points + points[:1]
+      for (x, y) in points:
+        print(",".join([study.path, str(index), repr(x), repr(y)]))
+
+# Reads feasible region polygons (from "trace --closed") and prints how much
+# of the obtuse apex domain (within the box) their union leaves uncovered:
+#   area,domain area,covered area,uncovered low,uncovered high
+# followed by one row per connected uncovered component, largest first:
+#   component,cells,area,xmin,xmax,ymin,ymax,x,y
+# where (x, y) is an apex near the middle of the component.
+def RunRegionCoverage(args):
+  union = regions.RegionUnion(
+      args.cell_size, (args.xmin, args.xmax, args.ymin, args.ymax))
+  for filename in args.files:
+    for (path, polygons) in regions.RegionsInFile(filename):
+      union.addRegion(polygons)
+  (domainArea, coveredArea, (low, high)) = union.areas()
+  print(",".join(
+      ["area"] + [str(v) for v in [domainArea, coveredArea, low, high]]))
+  components = union.uncoveredComponents()
+  if args.components is not None:
+    components = components[:args.components]
+  for (cells, area, (xmin, xmax, ymin, ymax), (x, y)) in components:
+    print(",".join(["component"] + [
+        str(v) for v in [cells, area, xmin, xmax, ymin, ymax, x, y]]))
+  sys.stderr.write(str(union.regionCount) + " regions\n")
+
+def RunProbability(args):
+  prob = probability.SuccessProbability(args.trials, args.successes, args.p)
+  failure = probability.FailureProbability(args.trials, args.successes, args.p)
+  print(str(prob) + "," + str(failure))
+  if args.confidence:
+    (low, high) = probability.ConfidenceInterval(
+        args.trials, args.successes, args.confidence)
+    print(str(low) + "," + str(high))
+
+def RunCoverage(args):
+  counts = coverage.CoverageCounts(args.bin_size)
+  for filename in args.files:
+    counts.addFile(filename, args.families)
+  coverage.PrintCoverageReport(
+      counts, args.confidence, args.replicates, args.target, args.seed)
+
+def RunFollow(args):
+  follower = follow.SearchFollower(args.files, args.bin_size, args.mirror)
+  follow.Follow(
+      follower, args.interval, args.publish_interval, args.idle_exit,
+      args.output, args.top)
+
+def RunStoreIngest(args):
+  pathStore = store.PathStore(args.database)
+  try:
+    for filename in args.files:
+      added = pathStore.ingestFile(filename, args.batch_size)
+      sys.stderr.write(filename + ": " + str(added) + " rows\n")
+    pathStore.createIndexes()
+  finally:
+    pathStore.close()
+
+# Prints the result of an SQL query on a database built by store-ingest as
+# CSV, e.g. "SELECT x, y FROM apexPaths WHERE flipCount >= 4".
+def RunStoreQuery(args):
+  pathStore = store.PathStore(args.database)
+  try:
+    (columns, rows) = pathStore.query(args.sql)
+    if args.header:
+      print(",".join(columns))
+    for row in rows:
+      print(",".join(["" if c is None else str(c) for c in row]))
+  finally:
+    pathStore.close()
+
+# Prints a Swift point set as x,y rows, like the first two columns of the
+# search result CSVs.
+def RunSwiftPoints(args):
+  for path in args.paths:
+    if args.exact:
+      for (offset, point) in swiftdata.JsonArrayElements(
+          swiftdata.ElementsFilename(path)):
+        print(point["x"] + "," + point["y"])
+    else:
+      for (x, y) in swiftdata.PointSetCoords(path):
+        print(str(x) + "," + str(y))
+
+# Prints id,edge path,feasible x,feasible y for each cycle of a Swift cycle
+# set, with the count form of the path last if requested.
+def RunSwiftCycles(args):
+  for path in args.paths:
+    for cycle in swiftdata.CycleSetCycles(path):
+      edgePath = cycle.edgePathStr()
+      if args.canonical:
+        edgePath = CachedCanonicalEdgePath(edgePath)
+      apex = cycle.feasiblePoint()
+      fields = [str(cycle.id), edgePath, str(apex.x), str(apex.y)]
+      if args.counts:
+        fields.append(str(billiards.PathCountForm(
+            billiards.CachedCountsForEdgePath(edgePath))))
+      print(",".join(fields))
+
+# Converts paths between edge paths, Swift turns and count forms, one per
+# line; "-" reads standard input. Edge paths can also be read from the search
+# result CSVs.
+def RunConvert(args):
+  converter = pathforms.PathConverter(args.source, args.target, args.canonical)
+  for filename in args.files:
+    if args.source == "edge" and filename != "-":
+      lines = EdgePathsInFile(filename)
+    else:
+      lines = NonEmptyLines(filename)
+    for (source, target) in converter.convertStrings(lines):
+      if target is None:
+        target = ""
+      print(source + "," + target if args.both else target)
+  if converter.failures > 0:
+    sys.stderr.write(
+        str(converter.failures) + " paths had no " + args.target + " form\n")
+
+def RunBatch(args):
+  for filename in args.files:
+    with open(filename) as f:
+      for line in f:
+        line = line.strip()
+        if len(line) == 0 or line.startswith("#"):
+          continue
+        Run(shlex.split(line))
+
+def ArgumentParser():
+  parser = argparse.ArgumentParser(
+      prog="analyze.py", description="Billiard path analyses")
+  subparsers = parser.add_subparsers(dest="command")
+
+  sub = subparsers.add_parser(
+      "stats", help="count form / fan count / flip count for each data point")
+  sub.add_argument("files", nargs="*",
+      help="success CSVs or files with one edge path per line")
+  sub.add_argument("--summary", action="store_true",
+      help="print data point totals per path instead of per-point rows")
+  sub.add_argument("--coords", action="store_true",
+      help="print count, bounding box, centroid and convex hull of the data "
+      "points of each path instead of per-point rows")
+  sub.add_argument("--mirror", action="store_true",
+      help="count paths and their mirror images (x -> 1 - x) as one")
+  sub.add_argument("--checkpoint",
+      help="saved stats to start from and update with the new rows")
+  sub.add_argument("--keep-coords", action="store_true",
+      help="save every data point in a new checkpoint rather than just "
+      "per-path summaries (needed for per-point rows from a checkpoint)")
+  sub.set_defaults(run=RunStats)
+
+  sub = subparsers.add_parser("canonicalize", help="canonical edge paths")
+  sub.add_argument("files", nargs="+")
+  sub.add_argument("--counts", action="store_true",
+      help="print count forms instead of edge paths")
+  sub.add_argument("--mirror", action="store_true",
+      help="identify paths with their mirror images (x -> 1 - x)")
+  sub.set_defaults(run=RunCanonicalize)
+
+  sub = subparsers.add_parser(
+      "family", help="data point totals per minimal count form")
+  sub.add_argument("files", nargs="*")
+  sub.add_argument("--mirror", action="store_true",
+      help="count paths and their mirror images (x -> 1 - x) as one")
+  sub.add_argument("--checkpoint",
+      help="saved stats to start from and update with the new rows")
+  sub.set_defaults(run=RunFamily)
+
+  sub = subparsers.add_parser(
+      "checkpoint-merge", help="combine stats checkpoints of disjoint inputs")
+  sub.add_argument("output")
+  sub.add_argument("inputs", nargs="+")
+  sub.set_defaults(run=RunCheckpointMerge)
+
+  sub = subparsers.add_parser(
+      "distinct", help="multiplicity of each distinct canonical path")
+  sub.add_argument("files", nargs="+")
+  sub.add_argument("--counts", action="store_true",
+      help="count distinct count forms instead of edge paths")
+  sub.add_argument("--mirror", action="store_true",
+      help="identify paths with their mirror images (x -> 1 - x)")
+  sub.add_argument("--memory-limit", type=float, default=256,
+      help="megabytes of counts to hold before spilling to disk")
+  sub.add_argument("--temp-dir",
+      help="directory for spilled runs (default: the system temp dir)")
+  sub.set_defaults(run=RunDistinct)
+
+  sub = subparsers.add_parser("winding", help="winding number statistics")
+  sub.add_argument("files", nargs="+")
+  sub.add_argument("--memory-limit", type=float,
+      help="count distinct paths on disk past this many megabytes")
+  sub.add_argument("--temp-dir",
+      help="directory for spilled runs (default: the system temp dir)")
+  sub.set_defaults(run=RunWinding)
+
+  sub = subparsers.add_parser(
+      "constraint-sweep", help="evaluate path constraints on an apex grid")
+  sub.add_argument("paths", nargs="*")
+  sub.add_argument("--path-file", dest="path_files", action="append",
+      default=[])
+  sub.add_argument("--pair", type=int, nargs=2, metavar=("LEFT", "RIGHT"))
+  sub.add_argument("--signs", action="store_true",
+      help="print exact signs (float filter with exact fallback) instead")
+  sub.add_argument("--active", action="store_true",
+      help="only evaluate the constraints that can be active in the grid")
+  sub.add_argument("--fans", action="store_true",
+      help="evaluate the minimum per fan instead of per turn")
+  sub.add_argument("--mirror", action="store_true",
+      help="with --signs, only evaluate x <= 1/2, using the mirror image of "
+      "each path")
+  sub.add_argument("--xmin", type=float, default=0.0)
+  sub.add_argument("--xmax", type=float, default=0.5)
+  sub.add_argument("--ymin", type=float, default=0.0)
+  sub.add_argument("--ymax", type=float, default=0.5)
+  sub.add_argument("--steps", type=int, default=10)
+  sub.set_defaults(run=RunConstraintSweep)
+
+  sub = subparsers.add_parser("family-sweep",
+      help="feasibility margins along a family with growing fans (empty "
+      "for members the fan angle bound rules out)")
+  sub.add_argument("path", help="member 0 of the family")
+  sub.add_argument("increments", type=int, nargs="+",
+      help="extra turns per member for each run of identical turns in PATH")
+  sub.add_argument("--apex", dest="apexes", type=float, nargs=2,
+      action="append", default=[], metavar=("X", "Y"))
+  sub.add_argument("--first", type=int, default=1)
+  sub.add_argument("--last", type=int, default=100)
+  sub.set_defaults(run=RunFamilySweep)
+
+  sub = subparsers.add_parser(
+      "screen", help="the paths in the files that are feasible at one apex")
+  sub.add_argument("x", type=float)
+  sub.add_argument("y", type=float)
+  sub.add_argument("files", nargs="+")
+  sub.add_argument("--processes", type=int, default=1)
+  sub.set_defaults(run=RunScreen)
+
+  sub = subparsers.add_parser(
+      "trace", help="boundary curves of feasible regions")
+  sub.add_argument("paths", nargs="*")
+  sub.add_argument("--path-file", dest="path_files", action="append",
+      default=[])
+  sub.add_argument("--pair", type=int, nargs=2, metavar=("LEFT", "RIGHT"),
+      help="trace the zero set of one constraint instead")
+  sub.add_argument("--xmin", type=float, default=0.0)
+  sub.add_argument("--xmax", type=float, default=0.5)
+  sub.add_argument("--ymin", type=float, default=0.0)
+  sub.add_argument("--ymax", type=float, default=0.5)
+  sub.add_argument("--steps", type=int, default=64,
+      help="marching squares grid cells per axis")
+  sub.add_argument("--tolerance", type=float, default=1e-6)
+  sub.add_argument("--closed", action="store_true",
+      help="close curves along the region boundary into polygons")
+  sub.set_defaults(run=RunTrace)
+
+  sub = subparsers.add_parser("region-coverage",
+      help="uncovered area of the union of traced feasible regions")
+  sub.add_argument("files", nargs="+", help="output of trace --closed")
+  sub.add_argument("--cell-size", dest="cell_size", type=float,
+      default=1.0 / 1024)
+  sub.add_argument("--xmin", type=float, default=0.0)
+  sub.add_argument("--xmax", type=float, default=1.0)
+  sub.add_argument("--ymin", type=float, default=0.0)
+  sub.add_argument("--ymax", type=float, default=0.5)
+  sub.add_argument("--components", type=int,
+      help="only print this many of the largest uncovered components")
+  sub.set_defaults(run=RunRegionCoverage)
+
+  sub = subparsers.add_parser("probability",
+      help="probability of at least SUCCESSES successes in TRIALS trials")
+  sub.add_argument("trials", type=int)
+  sub.add_argument("successes", type=int)
+  sub.add_argument("p", type=float)
+  sub.add_argument("--confidence", type=float,
+      help="also print the confidence interval for SUCCESSES / TRIALS")
+  sub.set_defaults(run=RunProbability)
+
+  sub = subparsers.add_parser("coverage",
+      help="success rates per apex bin from success / fail CSVs")
+  sub.add_argument("files", nargs="+")
+  sub.add_argument("--bin-size", dest="bin_size", type=float, default=0.01)
+  sub.add_argument("--confidence", type=float, default=0.95)
+  sub.add_argument("--replicates", type=int, default=200,
+      help="bootstrap replicates per bin (0 to skip)")
+  sub.add_argument("--target", type=float,
+      help="also print P(>= successes) if the true rate were TARGET")
+  sub.add_argument("--families", action="store_true",
+      help="also report the share of apexes covered by each path family")
+  sub.add_argument("--seed", type=int, default=0)
+  sub.set_defaults(run=RunCoverage)
+
+  sub = subparsers.add_parser("store-ingest",
+      help="add success / fail CSVs to a SQLite database of paths and apexes")
+  sub.add_argument("database")
+  sub.add_argument("files", nargs="+")
+  sub.add_argument("--batch-size", dest="batch_size", type=int,
+      default=100000, help="rows per transaction")
+  sub.set_defaults(run=RunStoreIngest)
+
+  sub = subparsers.add_parser("store-query",
+      help="run an SQL query on a database built by store-ingest")
+  sub.add_argument("database")
+  sub.add_argument("sql")
+  sub.add_argument("--header", action="store_true",
+      help="print the column names first")
+  sub.set_defaults(run=RunStoreQuery)
+
+  sub = subparsers.add_parser("follow",
+      help="summarize success / fail CSVs while a search appends to them")
+  sub.add_argument("files", nargs="+")
+  sub.add_argument("--interval", type=float, default=5,
+      help="seconds between polls of the files")
+  sub.add_argument("--publish-interval", dest="publish_interval", type=float,
+      default=60, help="minimum seconds between summaries")
+  sub.add_argument("--idle-exit", dest="idle_exit", type=float,
+      help="stop after the files haven't grown for this many seconds")
+  sub.add_argument("--output",
+      help="file to replace with each summary (default: print them)")
+  sub.add_argument("--top", type=int, default=10,
+      help="number of paths and families to list")
+  sub.add_argument("--bin-size", dest="bin_size", type=float, default=0.01)
+  sub.add_argument("--mirror", action="store_true",
+      help="count paths and their mirror images (x -> 1 - x) as one")
+  sub.set_defaults(run=RunFollow)
+
+  sub = subparsers.add_parser("swift-points",
+      help="x,y rows of Swift point sets (pointset/<name> directories)")
+  sub.add_argument("paths", nargs="+",
+      help="point set directories or their elements.json files")
+  sub.add_argument("--exact", action="store_true",
+      help="print the exact rationals instead of floats")
+  sub.set_defaults(run=RunSwiftPoints)
+
+  sub = subparsers.add_parser("swift-cycles",
+      help="edge paths of Swift cycle sets (cycleset/<name> directories)")
+  sub.add_argument("paths", nargs="+",
+      help="cycle set directories or their elements.json files")
+  sub.add_argument("--canonical", action="store_true",
+      help="print canonical edge paths")
+  sub.add_argument("--counts", action="store_true",
+      help="also print the count form of each path")
+  sub.set_defaults(run=RunSwiftCycles)
+
+  sub = subparsers.add_parser("convert",
+      help="convert between edge paths, Swift turns and count forms")
+  sub.add_argument("files", nargs="+",
+      help="files with one path per line, or - for standard input")
+  sub.add_argument("--from", dest="source", choices=pathforms.forms,
+      default="edge")
+  sub.add_argument("--to", dest="target", choices=pathforms.forms,
+      default="turns")
+  sub.add_argument("--canonical", action="store_true",
+      help="canonicalize edge paths before converting them")
+  sub.add_argument("--both", action="store_true",
+      help="print input,output pairs")
+  sub.set_defaults(run=RunConvert)
+
+  sub = subparsers.add_parser(
+      "batch", help="run one subcommand per line of each job file")
+  sub.add_argument("files", nargs="+")
+  sub.set_defaults(run=RunBatch)
+
+  return parser
+
+def Run(argv):
+  parser = ArgumentParser()
+  args = parser.parse_args(argv)
+  if not hasattr(args, "run"):
+    parser.print_usage()
+    sys.exit(1)
+  args.run(args)
+
+if __name__ == "__main__":
+  Run(sys.argv[1:])
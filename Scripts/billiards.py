@@ -1,4 +1,10 @@
-import csv
+import binascii
+import math
+import multiprocessing
+import random
+import re
+from array import array
+from fractions import Fraction
 
 class Coords2d:
   def __init__(self, x, y):
@@ -31,6 +37,9 @@ class OffsetCoords2d:
   def __add__(self, offset):
     return OffsetCoords2d(self.dx + offset.dx, self.dy + offset.dy)
 
+  def __sub__(self, offset):
+    return OffsetCoords2d(self.dx - offset.dx, self.dy - offset.dy)
+
   def __radd__(self, other):
     if other == 0:
       return self
@@ -180,6 +189,65 @@ class Complex:
   def squaredLength(self):
     return self.x * self.x + self.y * self.y
 
+# A closed interval of reals. Arithmetic is rounded outward, so evaluating a
+# formula (e.g. PathGeometryRing with an apex whose coordinates are intervals)
+# gives an interval that contains every value the formula takes on the box.
+class Interval:
+  # Relative widening applied after every operation; more than the half-ulp
+  # rounding error of a single float operation.
+  roundingSlack = 2.3e-16
+
+  def __init__(self, lo, hi):
+    self.lo = lo
+    self.hi = hi
+
+  @staticmethod
+  def rounded(lo, hi):
+    slack = Interval.roundingSlack
+    return Interval(
+        lo - abs(lo) * slack - 5e-324, hi + abs(hi) * slack + 5e-324)
+
+  @staticmethod
+  def of(v):
+    if isinstance(v, Interval):
+      return v
+    return Interval(float(v), float(v))
+
+  def __repr__(self):
+    return "Interval(" + str(self.lo) + ", " + str(self.hi) + ")"
+
+  def __add__(self, v):
+    v = Interval.of(v)
+    return Interval.rounded(self.lo + v.lo, self.hi + v.hi)
+
+  def __radd__(self, v):
+    return self + v
+
+  def __neg__(self):
+    return Interval(-self.hi, -self.lo)
+
+  def __sub__(self, v):
+    return self + -Interval.of(v)
+
+  def __rsub__(self, v):
+    return Interval.of(v) + -self
+
+  def __mul__(self, v):
+    if v is self:
+      # Squares are never negative, which matters for norms.
+      if self.lo >= 0:
+        return Interval.rounded(self.lo * self.lo, self.hi * self.hi)
+      if self.hi <= 0:
+        return Interval.rounded(self.hi * self.hi, self.lo * self.lo)
+      return Interval.rounded(0.0, max(self.lo * self.lo, self.hi * self.hi))
+    v = Interval.of(v)
+    products = [
+        self.lo * v.lo, self.lo * v.hi, self.hi * v.lo, self.hi * v.hi]
+    return Interval.rounded(min(products), max(products))
+
+  def __rmul__(self, v):
+    return self * v
+
 # Computes / caches path geometry details when the scalars are part of a field.
 class PathGeometryField:
   def __init__(self, apex):
@@ -221,10 +289,38 @@ class PathGeometryField:
       vec = Complex(-vec.x, -vec.y)
     return OffsetCoords2d(vec.x, vec.y)
 
-class PathGeometryRing:
-  def __init__(self, apex, maxAngles):
+# Like PathGeometryField, but takes every power of the (unit) base rotations
+# directly from its angle, so offsets for arbitrarily large coefficients cost
+# O(1) and nothing is cached. Float apexes only.
+class PathGeometryAngles(PathGeometryField):
+  def __init__(self, apex):
+    PathGeometryField.__init__(self, apex)
+    self.angles = [
+        2 * math.atan2(apex.y, apex.x), 2 * math.atan2(apex.y, 1 - apex.x)]
+
+  # The rotation by coefficients[0] * 2a + coefficients[1] * 2b.
+  def angleForCoefficients(self, coefficients):
+    return coefficients[0] * self.angles[0] + coefficients[1] * self.angles[1]
+
+  def rotationForBaseAngle(self, baseAngle):
+    return Cis(self.angleForCoefficients(baseAngle.coefficients))
+
+def Cis(t):
+  return Complex(math.cos(t), math.sin(t))
+
+# The powers of the two base rotations, and of their norms, at one apex. A
+# PathGeometryRing only needs these up to its path's maxAngles, so a single
+# table can be shared by every path evaluated at the same apex (see
+# ScreenPathStudiesAtApex); it grows as longer paths ask for it.
+class PathPowerTable:
+  # normalized: for float or interval apexes, divide each rotation and norm
+  # by the power of 2 nearest its norm, and have PathGeometryRing shift its
+  # powers by powers of 2 too, so offsets have moduli near their edge lengths
+  # however long the path is (see offsetScale). Every value is then a fixed
+  # positive multiple of the unnormalized one, and no rounding is added, but
+  # nothing underflows either.
+  def __init__(self, apex, normalized=False):
     self.apex = apex
-    self.maxAngles = maxAngles
     z0 = Complex(apex.x, apex.y)
     z1 = Complex(1 - apex.x, apex.y)
     r0 = z0.times(z0)
@@ -233,25 +329,71 @@ class PathGeometryRing:
     self.norms = [z0.squaredLength(), z1.squaredLength()]
     self.edges = [
         Complex(1, 0), Complex(apex.x - 1, apex.y), Complex(-apex.x, -apex.y)]
-
-    normPowers = [[Complex(1, 0)], [Complex(1, 0)]]
+    self.normPowers = [[Complex(1, 0)], [Complex(1, 0)]]
+    self.rotationPowers = [[Complex(1, 0)], [Complex(1, 0)]]
+    self.normalized = False
+    if normalized and min([FloatLowerBound(n) for n in self.norms]) > 0:
+      self.normalized = True
+      for i in range(2):
+        factor = 2.0 ** -int(round(math.log(FloatLowerBound(self.norms[i]), 2)))
+        self.rotation[i] = self.rotation[i].timesScalar(factor)
+        self.norms[i] = self.norms[i] * factor
+
+  # The exponents of the powers of 2 PathGeometryRing multiplies its powers
+  # of rotation i by, so that norm0^maxAngles[0] * norm1^maxAngles[1] comes
+  # out near 1.
+  # (Shifts past 2^1000 would take the powers out of float range on the way,
+  # so then there are none.)
+  def powerShifts(self, maxAngles):
+    if not self.normalized:
+      return [0, 0]
+    shifts = [
+        -int(round(maxAngles[i] * math.log(FloatLowerBound(self.norms[i]), 2)))
+        for i in range(2)]
+    if max([abs(shift) for shift in shifts]) > 1000:
+      return [0, 0]
+    return shifts
+
+  # The modulus of every offset of PathGeometryRing(apex, maxAngles, self)
+  # divided by the length of its edge, for a float apex. It's computed in
+  # log space, so it doesn't underflow on the way even if it would have to
+  # for an unnormalized table.
+  def offsetScale(self, maxAngles):
+    shifts = self.powerShifts(maxAngles)
+    return 2.0 ** sum([
+        maxAngles[i] * math.log(self.norms[i], 2) + shifts[i]
+        for i in range(2)])
+
+  def reserve(self, maxAngles):
     for i in range(2):
-      normArray = normPowers[i]
-      for _ in range(maxAngles[i]):
+      normArray = self.normPowers[i]
+      rotArray = self.rotationPowers[i]
+      while len(normArray) <= maxAngles[i]:
         normArray.append(normArray[-1].timesScalar(self.norms[i]))
-
-    rotationPowers = [[Complex(1, 0)], [Complex(1, 0)]]
-    for i in range(2):
-      rotArray = rotationPowers[i]
-      for _ in range(maxAngles[i]):
         rotArray.append(rotArray[-1].times(self.rotation[i]))
 
+class PathGeometryRing:
+  def __init__(self, apex, maxAngles, powerTable=None):
+    if powerTable is None:
+      powerTable = PathPowerTable(apex)
+    powerTable.reserve(maxAngles)
+    self.apex = apex
+    self.maxAngles = maxAngles
+    self.rotation = powerTable.rotation
+    self.norms = powerTable.norms
+    self.edges = powerTable.edges
+
+    normPowers = powerTable.normPowers
+    rotationPowers = powerTable.rotationPowers
+    shifts = powerTable.powerShifts(maxAngles)
     cachedPowers = [[], []]
     for i in range(2):
       cacheArray = cachedPowers[i]
       for n in range(maxAngles[i] + 1):
-        cacheArray.append(
-            rotationPowers[i][n] * normPowers[i][maxAngles[i] - n])
+        power = rotationPowers[i][n] * normPowers[i][maxAngles[i] - n]
+        if shifts[i] != 0:
+          power = power.timesScalar(2.0 ** shifts[i])
+        cacheArray.append(power)
     self.cachedPowers = cachedPowers
 
   def rotationForBaseAngle(self, baseAngle):
@@ -275,26 +417,584 @@ class PathGeometryRing:
     return OffsetCoords2d(vec.x, vec.y)
 
 
-def CanonicalizeEdgePath(edgePath):
-  candidates = []
-  baseEdgeIndex = 0
-  sign = 1
-  lastTurn = edgePath[-1]
-  for i in range(len(edgePath)):
-    turn = edgePath[i]
+# CanonicalStartIndices and FansForEdgePath both walk the same small
+# automaton over the turns of a path: the index mod 3 of the edge the path
+# reflects through (0 is the base edge), the parity sign of the step, and the
+# previous turn. Rather than stepping it one turn at a time in Python, the
+# walk is precomputed for every state and every chunk of up to
+# scanChunkLength turns, so a path is scanned with one table lookup per
+# chunk. Each entry is (state after the chunk, canonical start offsets in the
+# chunk, fan starts in the chunk), fan starts being (offset, angleIndex,
+# orientation, startsOnBaseEdge) as in Fan. Chunks are keyed both by their
+# turn strings and, for PackedEdgePaths, by ScanChunkKey of their bits, so
+# packed paths are scanned a byte at a time (which is why chunks are 8 turns)
+# without being unpacked.
+scanChunkLength = 8
+# scanTable[state][chunk], built on first use.
+scanTable = None
+
+def ScanState(edgeIndex, paritySign, lastTurn):
+  return edgeIndex * 4 + (2 if paritySign == 1 else 0) + (
+      1 if lastTurn == "R" else 0)
+
+def ScanChunk(state, chunk):
+  edgeIndex = state // 4
+  paritySign = 1 if state & 2 else -1
+  lastTurn = "R" if state & 1 else "L"
+  canonicalStarts = []
+  fanStarts = []
+  for i, turn in enumerate(chunk):
     turnSign = -1 if turn == "L" else 1
-    if baseEdgeIndex == 0 and sign == 1 and lastTurn == "L" and turn == "R":
-      candidates.append(i)
-    baseEdgeIndex = (baseEdgeIndex + turnSign * sign) % 3
+    if edgeIndex == 0 and paritySign == 1 and lastTurn == "L" and turn == "R":
+      canonicalStarts.append(i)
+    newEdgeIndex = (edgeIndex + turnSign * paritySign) % 3
+    if newEdgeIndex != 0 and edgeIndex != 0:
+      fanStarts.append((i, newEdgeIndex % 2, turnSign, True))
+    elif lastTurn != turn and newEdgeIndex != 0:
+      fanStarts.append((i, newEdgeIndex % 2, -turnSign, False))
+    edgeIndex = newEdgeIndex
+    paritySign = -paritySign
     lastTurn = turn
-    sign = -sign
+  return (
+      ScanState(edgeIndex, paritySign, lastTurn), tuple(canonicalStarts),
+      tuple(fanStarts))
+
+# The packed key of a chunk of length turns with the given bits (R = 1, first
+# turn most significant): the bits below a 1 marking the length.
+def ScanChunkKey(length, bits):
+  return (1 << length) | bits
+
+def ScanTable():
+  global scanTable
+  if scanTable is None:
+    chunks = [""]
+    allChunks = []
+    for length in range(scanChunkLength):
+      chunks = [chunk + turn for chunk in chunks for turn in "LR"]
+      allChunks.extend(chunks)
+    scanTable = []
+    for state in range(12):
+      entries = {}
+      for chunk in allChunks:
+        entry = ScanChunk(state, chunk)
+        entries[chunk] = entry
+        entries[ScanChunkKey(
+            len(chunk), PackedEdgePath.fromString(chunk).bits)] = entry
+      scanTable.append(entries)
+  return scanTable
+
+# Returns (canonical start indices, fan starts) for edgePath, with absolute
+# offsets. A PackedEdgePath is read straight from its bytes.
+def ScanEdgePath(edgePath):
+  table = ScanTable()
+  if isinstance(edgePath, PackedEdgePath):
+    chunks = edgePath.scanChunkKeys()
+  else:
+    chunks = [
+        edgePath[offset:offset + scanChunkLength]
+        for offset in range(0, len(edgePath), scanChunkLength)]
+  state = ScanState(0, 1, edgePath[-1])
+  canonicalStarts = []
+  fanStarts = []
+  for (k, chunk) in enumerate(chunks):
+    offset = k * scanChunkLength
+    (state, chunkCanonicalStarts, chunkFanStarts) = table[state][chunk]
+    for i in chunkCanonicalStarts:
+      canonicalStarts.append(offset + i)
+    for (i, angleIndex, orientation, startsOnBaseEdge) in chunkFanStarts:
+      fanStarts.append((offset + i, angleIndex, orientation, startsOnBaseEdge))
+  return (canonicalStarts, fanStarts)
+
+# The offsets at which edgePath could start in canonical form: after a
+# reflection through the base edge with parity sign 1, between an L and an R.
+def CanonicalStartIndices(edgePath):
+  return ScanEdgePath(edgePath)[0]
+
+def CanonicalizeEdgePath(edgePath):
+  candidates = CanonicalStartIndices(edgePath)
   if len(candidates) == 0:
-    print("CanonicalizeEdgePath failed: " + edgePath)
+    print("CanonicalizeEdgePath failed: " + str(edgePath))
     return edgePath
   candidateStrings = [edgePath[i:] + edgePath[:i] for i in candidates]
   candidateStrings.sort()
   return candidateStrings[0]
 
+# The canonical path of the mirror image of edgePath's trajectory in the
+# triangle with the apex reflected through x = 1/2 (i.e. with the base
+# vertices swapped), so that edgePath is feasible at (x, y) exactly when its
+# mirror is feasible at (1 - x, y). Mirroring swaps every L and R; the result
+# is also reversed, which traces the same trajectory backwards and brings it
+# back to the traversal direction CanonicalizeEdgePath expects. (These are
+# TurnPath.transpose and inverse on the Swift side.)
+def MirrorEdgePath(edgePath):
+  if isinstance(edgePath, PackedEdgePath):
+    return CanonicalizeEdgePath(edgePath.swappedAndReversed())
+  mirrored = "".join(['L' if turn == 'R' else 'R' for turn in edgePath])
+  return CanonicalizeEdgePath(mirrored[::-1])
+
+# Returns (canonical, mirrored), where canonical is the lesser of the
+# canonical forms of edgePath and of its mirror, and mirrored says whether
+# it is the mirror's (so apexes for edgePath must be reflected to apply to
+# it).
+def SymmetricCanonicalEdgePath(edgePath):
+  canonical = CanonicalizeEdgePath(edgePath)
+  mirror = MirrorEdgePath(canonical)
+  if mirror < canonical:
+    return (mirror, True)
+  return (canonical, False)
+
+# Like SymmetricCanonicalEdgePath for count forms: returns (counts, mirrored)
+# with the lesser of the count forms of edgePath and of its mirror.
+def SymmetricCountsForEdgePath(edgePath):
+  counts = CountsForEdgePath(edgePath)
+  mirrorCounts = CountsForEdgePath(MirrorEdgePath(edgePath))
+  if mirrorCounts < counts:
+    return (mirrorCounts, True)
+  return (counts, False)
+
+# Computes PathStudy.maxAngles directly from the turns, without building the
+# vertex / edge graph. This is the same walk as computePathMetadata, reduced to
+# the two angle coefficients: the triangle at step i is reflected exactly when
+# i is odd, so the reflection sign is always the parity sign of the step.
+def MaxAnglesForEdgePath(edgePath):
+  maxAngles = [0, 0]
+  coefficients = [0, 0]
+  sign = 1
+  baseEdgeIndex = 0
+  for turn in edgePath:
+    if turn == 'L':
+      baseEdgeIndex = (baseEdgeIndex - sign) % 3
+    else:
+      baseEdgeIndex = (baseEdgeIndex + sign) % 3
+    if baseEdgeIndex == 1:
+      coefficients[1] -= sign
+      maxAngles[1] = max(maxAngles[1], abs(coefficients[1]))
+    elif baseEdgeIndex == 2:
+      coefficients[0] += sign
+      maxAngles[0] = max(maxAngles[0], abs(coefficients[0]))
+    sign = -sign
+  return maxAngles
+
+# Returns [r0, r1, r2], where ri is the largest number of consecutive
+# triangles of the path that share triangle vertex i (0 and 1 are the base
+# vertices, 2 is the apex), i.e. the longest run of identical turns pivoting
+# around that vertex. Runs wrap around the end of the (periodic) path.
+# The vertex a run pivots around is the one shared by the two edges each of
+# its triangles is crossed through, which is vertex 0 for edges {0, 2},
+# vertex 1 for {0, 1} and the apex for {1, 2}.
+def MaxFanRunsForEdgePath(edgePath):
+  runs = FanRunPivotsForEdgePath(edgePath)
+  if len(runs) > 1 and edgePath[0] == edgePath[-1]:
+    runs[0][1] += runs.pop()[1]
+  maxRuns = [0, 0, 0]
+  for (pivot, length) in runs:
+    maxRuns[pivot] = max(maxRuns[pivot], length)
+  return maxRuns
+
+# Returns [[pivot, length]] for each maximal run of identical turns in
+# edgePath, without joining the first and last runs.
+def FanRunPivotsForEdgePath(edgePath):
+  pivotForEdgeSum = {2: 0, 1: 1, 3: 2}
+  runs = []
+  sign = 1
+  baseEdgeIndex = 0
+  prevTurn = None
+  for turn in edgePath:
+    if turn == 'L':
+      newBaseEdgeIndex = (baseEdgeIndex - sign) % 3
+    else:
+      newBaseEdgeIndex = (baseEdgeIndex + sign) % 3
+    if turn == prevTurn:
+      runs[-1][1] += 1
+    else:
+      runs.append([pivotForEdgeSum[baseEdgeIndex + newBaseEdgeIndex], 1])
+    prevTurn = turn
+    sign = -sign
+    baseEdgeIndex = newBaseEdgeIndex
+  return runs
+
+# A maximal run of identical turns in a path, i.e. a fan of triangles around
+# one boundary vertex (the pivot): L runs add right vertices around a fixed
+# left vertex, R runs add left vertices around a fixed right vertex.
+class FanRun:
+  # turn: 'L' or 'R'
+  # firstIndex: int, the boundary index of the vertex added by the first turn
+  #   (on the right side for L runs, the left side for R runs)
+  # edgeVectors: [EdgeVector], the internal edges (pointing left to right)
+  #   after the first and second turns of the run
+  # step: [int, int], the change in base angle coefficients every two turns
+  # length: int, the number of turns
+  def __init__(self, turn, firstIndex, edgeVector):
+    self.turn = turn
+    self.firstIndex = firstIndex
+    self.edgeVectors = [edgeVector]
+    self.step = [0, 0]
+    self.length = 1
+
+  # The internal edge after turn j (1 <= j <= length) of the run is
+  # edgeVectors[(j - 1) % 2] rotated by ((j - 1) // 2) steps: consecutive
+  # triangles of a fan alternate between the same two edges at the pivot, so
+  # every second one is the same triangle turned by twice the pivot angle.
+  def edgeForTurn(self, j):
+    return (self.edgeVectors[(j - 1) % 2], (j - 1) // 2)
+
+# Splits the path into FanRuns with the same walk as computePathMetadata,
+# without building the vertex / edge graph.
+def FanRunsForEdgePath(edgePath):
+  runs = []
+  baseAngle = BaseAngle.zero()
+  sign = 1
+  baseEdgeIndex = 0
+  leftIndex = 0
+  rightIndex = 0
+  prevTurn = None
+  for turn in edgePath:
+    if turn == 'L':
+      newBaseEdgeIndex = (baseEdgeIndex - sign) % 3
+      rightIndex += 1
+    else:
+      newBaseEdgeIndex = (baseEdgeIndex + sign) % 3
+      leftIndex += 1
+    baseAngle = baseAngle.reflectThroughEdgeIndex(newBaseEdgeIndex)
+    edgeVector = baseAngle.triangleEdge(newBaseEdgeIndex)
+    if turn == prevTurn:
+      run = runs[-1]
+      run.length += 1
+      if run.length == 2:
+        run.edgeVectors.append(edgeVector)
+      elif run.length == 3:
+        firstCoefficients = run.edgeVectors[0].baseAngle.coefficients
+        run.step = [
+            baseAngle.coefficients[0] - firstCoefficients[0],
+            baseAngle.coefficients[1] - firstCoefficients[1]]
+    else:
+      firstIndex = rightIndex if turn == 'L' else leftIndex
+      runs.append(FanRun(turn, firstIndex, edgeVector))
+    prevTurn = turn
+    sign = -sign
+    baseEdgeIndex = newBaseEdgeIndex
+  return runs
+
+# Returns (value, m) minimizing Re(w * Cis(m * angle)) over integers
+# 0 <= m < count. The continuous minima are where the argument of
+# w * Cis(m * angle) is pi (mod 2 pi), so only the endpoints and the integers
+# on either side of each of those need to be checked -- a single one when the
+# run spans less than a full turn, as it does for any feasible path. Runs
+# that wrap around further (only possible for infeasible paths) are only
+# searched over their first full turn, so the cost doesn't grow with the
+# run's length; later turns sample the same circle at shifted phases, which
+# can only lower the minimum by less than |w| (1 - cos(angle / 2)).
+def ArcMinimum(w, angle, count):
+  candidates = [0, count - 1]
+  if angle != 0 and count > 2:
+    # Search in the direction of increasing phase.
+    direction = 1 if angle > 0 else -1
+    phase = direction * math.atan2(w.y, w.x)
+    twoPi = 2 * math.pi
+    limit = min(count - 1, twoPi / abs(angle) + 1)
+    j = int(math.ceil((phase - math.pi) / twoPi))
+    while True:
+      m = (math.pi - phase + twoPi * j) / (direction * angle)
+      if m > limit:
+        break
+      if m >= 0:
+        candidates.append(int(math.floor(m)))
+        candidates.append(min(int(math.floor(m)) + 1, count - 1))
+      j += 1
+  best = None
+  for m in candidates:
+    v = w.times(Cis(m * angle)).x
+    if best is None or v < best[0]:
+      best = (v, m)
+  return best
+
+# Returns (leftPositions, rightPositions, spineTotal) for the path with the
+# given FanRuns in the unnormalized geometry pg (a PathGeometryAngles), where
+# leftPositions[i] / rightPositions[i] are the positions of the pivot and of
+# the last vertex added by fanRuns[i]. Each fan takes O(1) no matter how many
+# turns it has, since the last edge of a fan is one closed-form rotation of
+# its first.
+def FanPositions(fanRuns, pg):
+  # Left vertex 0 is the origin, right vertex 0 the end of the base edge.
+  left = OffsetCoords2d(0, 0)
+  right = pg.offsetForEdgeVector(BaseAngle.zero().triangleEdge(0))
+  leftPositions = []
+  rightPositions = []
+  for i in range(len(fanRuns)):
+    run = fanRuns[i]
+    (edgeVector, steps) = run.edgeForTurn(run.length)
+    last = FanOffset(pg, edgeVector, run.step, steps)
+    if run.turn == 'L':
+      right = left + last
+    else:
+      left = right - last
+    leftPositions.append(left)
+    rightPositions.append(right)
+  return (leftPositions, rightPositions, left)
+
+# The offset of edgeVector after the given number of fan steps.
+def FanOffset(pg, edgeVector, step, steps):
+  offset = pg.offsetForEdgeVector(edgeVector)
+  if steps == 0:
+    return offset
+  rotation = Cis(steps * pg.angleForCoefficients(step))
+  z = Complex(offset.dx, offset.dy).times(rotation)
+  return OffsetCoords2d(z.x, z.y)
+
+# Returns (margin, leftIndex, rightIndex) as in PathStudy.feasibilityMargin
+# for the path with the given FanRuns, in the units of PathGeometryAngles.
+# Within a fan the vertices added on the far side are pivot + e_j for the
+# internal edges e_j, which alternate between two geometric progressions,
+# so the extreme projection onto the spine normal over each progression is
+# found by ArcMinimum.
+def FanFeasibilityMargin(fanRuns, apex):
+  pg = PathGeometryAngles(apex)
+  (leftPositions, rightPositions, spineTotal) = FanPositions(fanRuns, pg)
+  normal = OffsetCoords2d(spineTotal.dy, -spineTotal.dx)
+  conjNormal = Complex(normal.dx, -normal.dy)
+
+  left = OffsetCoords2d(0, 0)
+  right = pg.offsetForEdgeVector(BaseAngle.zero().triangleEdge(0))
+  leftMax = (0, 0)
+  rightMin = (right.dot(normal), 0)
+  for i in range(len(fanRuns)):
+    run = fanRuns[i]
+    pivot = left if run.turn == 'L' else right
+    pivotProjection = pivot.dot(normal)
+    stepAngle = pg.angleForCoefficients(run.step)
+    # j = 2m + 1 + parity for 0 <= m < count.
+    for parity in range(min(2, run.length)):
+      offset = pg.offsetForEdgeVector(run.edgeVectors[parity])
+      w = Complex(offset.dx, offset.dy).times(conjNormal)
+      count = (run.length - parity + 1) // 2
+      (value, m) = ArcMinimum(w, stepAngle, count)
+      index = run.firstIndex + 2 * m + parity
+      if run.turn == 'L':
+        if pivotProjection + value < rightMin[0]:
+          rightMin = (pivotProjection + value, index)
+      elif pivotProjection - value > leftMax[0]:
+        leftMax = (pivotProjection - value, index)
+    left = leftPositions[i]
+    right = rightPositions[i]
+  return (rightMin[0] - leftMax[0], leftMax[1], rightMin[1])
+
+# A family of paths that differ only in the lengths of some of their fans,
+# like RRRLRRRLLLRLLL, RRRRRLRRRLLLLLRLLL, RRRRRRRLRRRLLLLLLLRLLL, ...
+# Member k has the turn runs of edgePath, with run i lengthened by
+# increments[i] * k turns (so edgePath itself is member 0). Increments must
+# be even, so every member crosses each fan's pivot from the same side.
+#
+# Lengthening a fan by two turns rotates everything after it by that fan's
+# step, and every later fan's base angles shift by the same coefficients, so
+# the FanRuns of any member follow from those of member 1 in O(number of
+# fans) without walking its turns; with FanFeasibilityMargin a member then
+# costs O(number of fans) at each apex however long it is.
+class PathFamily:
+  # edgePath: string
+  # increments: [int], one per maximal run of identical turns in edgePath
+  def __init__(self, edgePath, increments):
+    runs = FanRunsForEdgePath(edgePath)
+    if len(increments) != len(runs):
+      raise ValueError(
+          "expected " + str(len(runs)) + " increments, got " +
+          str(len(increments)))
+    if any([inc % 2 != 0 or inc < 0 for inc in increments]):
+      raise ValueError("increments must be even and nonnegative")
+    self.edgePath = edgePath
+    self.increments = list(increments)
+    self.runTurns = [run.turn for run in runs]
+    self.runLengths = [run.length for run in runs]
+    # Even increments keep the pivot of every run the same in all members.
+    self.runPivots = [
+        pivot for (pivot, length) in FanRunPivotsForEdgePath(edgePath)]
+    # Member 1 has every variable run at least 3 turns long, so its FanRuns
+    # know the step of each of them.
+    self.templateRuns = FanRunsForEdgePath(self.edgePathForMember(1))
+
+  def edgePathForMember(self, k):
+    return "".join([
+        turn * (length + inc * k) for (turn, length, inc) in zip(
+            self.runTurns, self.runLengths, self.increments)])
+
+  def fanRunsForMember(self, k):
+    def shifted(edgeVector, shift):
+      coefficients = edgeVector.baseAngle.coefficients
+      baseAngle = BaseAngle(
+          [coefficients[0] + shift[0], coefficients[1] + shift[1]],
+          edgeVector.baseAngle.reflected)
+      return EdgeVector(edgeVector.edgeIndex, baseAngle, edgeVector.clockwise)
+
+    runs = []
+    shift = [0, 0]
+    indexShift = {'L': 0, 'R': 0}
+    for (template, inc) in zip(self.templateRuns, self.increments):
+      edgeVectors = [shifted(e, shift) for e in template.edgeVectors]
+      run = FanRun(
+          template.turn, template.firstIndex + indexShift[template.turn],
+          edgeVectors[0])
+      run.edgeVectors = edgeVectors
+      run.step = template.step
+      run.length = template.length + inc * (k - 1)
+      runs.append(run)
+      # Each extra pair of turns in this run advances the base angles of
+      # everything after it by one step.
+      extraSteps = (inc // 2) * (k - 1)
+      shift = [
+          shift[0] + template.step[0] * extraSteps,
+          shift[1] + template.step[1] * extraSteps]
+      indexShift[template.turn] += inc * (k - 1)
+    return runs
+
+  # MaxFanRunsForEdgePath(edgePathForMember(k)), from the run lengths.
+  def maxFanRunsForMember(self, k):
+    lengths = [
+        length + inc * k
+        for (length, inc) in zip(self.runLengths, self.increments)]
+    pivots = list(self.runPivots)
+    if len(lengths) > 1 and self.runTurns[0] == self.runTurns[-1]:
+      lengths[0] += lengths.pop()
+      pivots.pop()
+    maxRuns = [0, 0, 0]
+    for (pivot, length) in zip(pivots, lengths):
+      maxRuns[pivot] = max(maxRuns[pivot], length)
+    return maxRuns
+
+  # Returns [[margin at each apex] for members firstMember..lastMember], with
+  # margins as in FanFeasibilityMargin, or None where the member fails the
+  # angle bound (see FanLimitsForApex) and so can't be feasible.
+  def feasibilityMargins(self, apexes, firstMember, lastMember):
+    margins = []
+    for k in range(firstMember, lastMember + 1):
+      maxRuns = self.maxFanRunsForMember(k)
+      passing = []
+      for apex in apexes:
+        limits = FanLimitsForApex(apex)
+        passing.append(all([r <= l for (r, l) in zip(maxRuns, limits)]))
+      runs = self.fanRunsForMember(k) if any(passing) else None
+      margins.append([
+          FanFeasibilityMargin(runs, apex)[0] if passes else None
+          for (apex, passes) in zip(apexes, passing)])
+    return margins
+
+# Apex (x, y) -> [k0, k1, k2], the longest fan run around each triangle
+# vertex (see MaxFanRunsForEdgePath) that a feasible path can have there.
+# Like countsCache, it is dropped whenever it grows past fanLimitCacheLimit
+# entries, since fine sweeps give every apex its own entry.
+fanLimitCache = {}
+fanLimitCacheLimit = 1 << 16
+
+# A run of k triangles around a vertex with angle t has k + 1 internal edges
+# leaving that vertex, spanning an angle of k * t, and the trajectory has to
+# cross all of them without passing through the vertex, which is only
+# possible if k * t < pi. (This is the bound UnitPowerCache._logBound tracks
+# on the Swift side.) The limits are rounded up slightly, so floating point
+# error can only make them more permissive.
+def FanLimitsForApex(apex):
+  key = (apex.x, apex.y)
+  limits = fanLimitCache.get(key)
+  if limits is None:
+    a = math.atan2(apex.y, apex.x)
+    b = math.atan2(apex.y, 1 - apex.x)
+    limits = []
+    for angle in [a, b, math.pi - a - b]:
+      if angle <= 0:
+        limits.append(0)
+      else:
+        limits.append(int(math.floor(math.pi * (1 + 1e-9) / angle)))
+    if len(fanLimitCache) >= fanLimitCacheLimit:
+      fanLimitCache.clear()
+    fanLimitCache[key] = limits
+  return limits
+
+# Returns [spine edge count, boundary spine edge count] for the path, i.e.
+# len(PathStudy.spineEdges) and the number of spine edges that lie along one
+# side of the boundary. Like MaxAnglesForEdgePath this only tracks the
+# endpoints of the base edges as (side, index) pairs, following the same
+# rules as computePathMetadata and computeSpine.
+def SpineCountsForEdgePath(edgePath):
+  leftIndex = 0
+  rightIndex = 0
+  baseEdges = [((0, 0), (1, 0))]
+  sign = 1
+  baseEdgeIndex = 0
+  for turn in edgePath:
+    if turn == 'L':
+      newBaseEdgeIndex = (baseEdgeIndex - sign) % 3
+      newBoundaryEdge = (baseEdgeIndex + sign) % 3
+      if newBoundaryEdge == 0:
+        baseEdges.append(((1, rightIndex), (1, rightIndex + 1)))
+      rightIndex += 1
+    else:
+      newBaseEdgeIndex = (baseEdgeIndex + sign) % 3
+      newBoundaryEdge = (baseEdgeIndex - sign) % 3
+      if newBoundaryEdge == 0:
+        baseEdges.append(((0, leftIndex), (0, leftIndex + 1)))
+      leftIndex += 1
+    if newBaseEdgeIndex == 0:
+      # Internal edges point left to right unless the right vertex is shared
+      # with the previous internal edge, which happens exactly on right turns.
+      if turn == 'L':
+        baseEdges.append(((0, leftIndex), (1, rightIndex)))
+      else:
+        baseEdges.append(((1, rightIndex), (0, leftIndex)))
+    sign = -sign
+    baseEdgeIndex = newBaseEdgeIndex
+
+  spineEdges = []
+  prevBaseEdge = baseEdges[0]
+  for baseEdge in baseEdges[1:]:
+    if baseEdge[0] == prevBaseEdge[1]:
+      spineEdges.append(prevBaseEdge)
+    prevBaseEdge = baseEdge
+  if len(spineEdges) == 0 or spineEdges[-1][1] != (0, leftIndex):
+    spineEdges.append(prevBaseEdge)
+
+  boundaryCount = 0
+  for (fromPos, toPos) in spineEdges:
+    if fromPos[0] == toPos[0]:
+      boundaryCount += 1
+  return [len(spineEdges), boundaryCount]
+
+# How the filtered sign evaluations (PathStudy.feasibilitySign and
+# constraintSign) were decided: evaluations is the total count, and
+# intervalFallbacks / exactFallbacks count the ones that the float error
+# bound (respectively the interval bound) couldn't decide.
+class SignFilterStats:
+  def __init__(self):
+    self.evaluations = 0
+    self.intervalFallbacks = 0
+    self.exactFallbacks = 0
+
+  def __repr__(self):
+    return "".join([
+        "SignFilterStats(", str(self.evaluations), " evaluations, ",
+        str(self.intervalFallbacks), " interval fallbacks, ",
+        str(self.exactFallbacks), " exact fallbacks)"])
+
+signFilterStats = SignFilterStats()
+
+def Sign(v):
+  if v > 0:
+    return 1
+  if v < 0:
+    return -1
+  return 0
+
+# A float no greater than v, for floats and Intervals.
+def FloatLowerBound(v):
+  if isinstance(v, Interval):
+    return v.lo
+  return float(v)
+
+# The apex as zero-width intervals, so float evaluation carries a rigorous
+# bound on its rounding error.
+def IntervalApex(apex):
+  return Coords2d(Interval.of(apex.x), Interval.of(apex.y))
+
+# The apex with its float coordinates converted exactly to rationals.
+def ExactApex(apex):
+  return Coords2d(Fraction(apex.x), Fraction(apex.y))
+
 class PathStudy:
   # Properties:
   # baseAngles : [BaseAngle] (the base angle of each triangle in the path)
@@ -306,12 +1006,56 @@ class PathStudy:
   # baseEdges : [PathEdge]
   # maxAngles : [int, int]
   # spineEdges : [PathEdge]
+  # spineCounts : [int, int] (see SpineCountsForEdgePath)
+  # maxFanRuns : [int, int, int] (see MaxFanRunsForEdgePath)
+  # fanRuns : [FanRun] (see FanRunsForEdgePath)
+  # spineEdgeCounts : [int, int, int] (edgeIndexCounts of spineEdges)
+  # boundaryEdgeCounts : [int, int, int] (edgeIndexCounts of the left and
+  #   right edges and the base edge, which boundaryPositions sums)
+  # activeConstraintsCache : {(region, parameters): activeConstraints result}
+  #
+  # All of these are computed on first access and then cached, so callers
+  # that only need e.g. maxAngles or the spine counts never build the
+  # vertex / edge graph.
+
+  metadataProperties = [
+      "baseAngles", "leftVertices", "rightVertices", "leftEdges",
+      "rightEdges", "internalEdges", "baseEdges"]
 
   def __init__(self, path):
     self.path = path
 
-    self.computePathMetadata()
-    self.computeSpine()
+  # Only called for attributes that haven't been set yet.
+  def __getattr__(self, name):
+    if name in PathStudy.metadataProperties:
+      self.computePathMetadata()
+    elif name == "spineEdges":
+      self.computeSpine()
+    elif name == "maxAngles":
+      self.maxAngles = MaxAnglesForEdgePath(self.path)
+    elif name == "maxFanRuns":
+      self.maxFanRuns = MaxFanRunsForEdgePath(self.path)
+    elif name == "fanRuns":
+      self.fanRuns = FanRunsForEdgePath(self.path)
+    elif name == "spineEdgeCounts":
+      self.spineEdgeCounts = PathStudy.edgeIndexCounts(self.spineEdges)
+    elif name == "boundaryEdgeCounts":
+      self.boundaryEdgeCounts = PathStudy.edgeIndexCounts(
+          self.leftEdges + self.rightEdges + self.internalEdges[:1])
+    elif name == "activeConstraintsCache":
+      self.activeConstraintsCache = {}
+    elif name == "spineCounts":
+      if "spineEdges" in self.__dict__:
+        boundaryCount = 0
+        for edge in self.spineEdges:
+          if edge.fromVert.pos.side == edge.toVert.pos.side:
+            boundaryCount += 1
+        self.spineCounts = [len(self.spineEdges), boundaryCount]
+      else:
+        self.spineCounts = SpineCountsForEdgePath(self.path)
+    else:
+      raise AttributeError(name)
+    return self.__dict__[name]
 
   # pos: BoundaryVertexPosition
   def vertexAtPos(self, pos):
@@ -440,6 +1184,8 @@ class PathStudy:
 
   # fromPos, toPos: BoundaryVertexPosition
   def spinePath(self, fromPos, toPos):
+    # Vertices only know their spine positions once the spine is built.
+    spineEdges = self.spineEdges
     path = []
     fromVert = self.vertexAtPos(fromPos)
     toVert = self.vertexAtPos(toPos)
@@ -449,7 +1195,7 @@ class PathStudy:
     toIndex = toVert.spinePosition.index
     minIndex = min(fromIndex, toIndex)
     maxIndex = max(fromIndex, toIndex)
-    spineSlice = self.spineEdges[minIndex:maxIndex]
+    spineSlice = spineEdges[minIndex:maxIndex]
     if fromIndex > toIndex:
       spineSlice = [edge.reverse() for edge in reversed(spineSlice)]
     path += spineSlice
@@ -464,15 +1210,319 @@ class PathStudy:
     spineTotal = sum(spineOffsets)
 
     def constraint(leftIndex, rightIndex):
+      return PathStudy.spinePathConstraint(
+          pg, spineTotal, self.pairSpinePath(leftIndex, rightIndex))
+
+    return constraint
+
+  # The spine path from left vertex leftIndex to right vertex rightIndex.
+  # The last pair asked for is remembered, since sweeps of a single
+  # constraint ask for the same one at every apex.
+  def pairSpinePath(self, leftIndex, rightIndex):
+    pair = self.__dict__.get("lastPairSpinePath")
+    if pair is None or pair[0] != (leftIndex, rightIndex):
       path = self.spinePath(
           BoundaryVertexPosition.left(leftIndex),
           BoundaryVertexPosition.right(rightIndex))
-      pathOffsets = [pg.offsetForEdgeVector(edge.edgeVector) for edge in path]
-      pathTotal = sum(pathOffsets)
-      pathRotated = OffsetCoords2d(-pathTotal.dy, pathTotal.dx)
-      return pathRotated.dot(spineTotal)
+      pair = ((leftIndex, rightIndex), path)
+      self.lastPairSpinePath = pair
+    return pair[1]
 
-    return constraint
+  # The constraint value of the given spine path, as in constraintFunctions,
+  # with its edges placed by pg.
+  @staticmethod
+  def spinePathConstraint(pg, spineTotal, path):
+    pathOffsets = [pg.offsetForEdgeVector(edge.edgeVector) for edge in path]
+    pathTotal = sum(pathOffsets)
+    pathRotated = OffsetCoords2d(-pathTotal.dy, pathTotal.dx)
+    return pathRotated.dot(spineTotal)
+
+  # constraintFunctions(apex)(leftIndex, rightIndex) for a single pair, given
+  # its spine path: only the spine and that path are placed.
+  def pairConstraint(self, apex, path, powerTable=None):
+    pg = PathGeometryRing(apex, self.maxAngles, powerTable)
+    spineTotal = sum([
+        pg.offsetForEdgeVector(edge.edgeVector) for edge in self.spineEdges])
+    return PathStudy.spinePathConstraint(pg, spineTotal, path)
+
+  def boundarySpineCount(self):
+    return self.spineCounts[1]
+
+  # Returns (leftPositions, rightPositions, normal): the positions of every
+  # left and right boundary vertex relative to left vertex 0, and the normal
+  # of the spine total, rotated so that
+  #   constraintFunctions(apex)(l, r) ==
+  #     (rightPositions[r] - leftPositions[l]).dot(normal).
+  # All positions are found in one pass along each boundary. powerTable, if
+  # given, is a PathPowerTable for apex shared with other paths.
+  def boundaryPositions(self, apex, powerTable=None):
+    pg = PathGeometryRing(apex, self.maxAngles, powerTable)
+    spineOffsets = [
+        pg.offsetForEdgeVector(edge.edgeVector) for edge in self.spineEdges]
+    spineTotal = sum(spineOffsets)
+    normal = OffsetCoords2d(spineTotal.dy, -spineTotal.dx)
+
+    position = OffsetCoords2d(0, 0)
+    leftPositions = [position]
+    for edge in self.leftEdges:
+      position = position + pg.offsetForEdgeVector(edge.edgeVector)
+      leftPositions.append(position)
+
+    # internalEdges[0] is the base edge, from left vertex 0 to right vertex 0.
+    position = pg.offsetForEdgeVector(self.internalEdges[0].edgeVector)
+    rightPositions = [position]
+    for edge in self.rightEdges:
+      position = position + pg.offsetForEdgeVector(edge.edgeVector)
+      rightPositions.append(position)
+    return (leftPositions, rightPositions, normal)
+
+  # Returns (margin, leftIndex, rightIndex), where margin is the minimum of
+  # constraintFunctions(apex)(leftIndex, rightIndex) over all pairs of
+  # boundary vertices (so the path is feasible at apex iff margin > 0) and
+  # (leftIndex, rightIndex) is a pair attaining it.
+  # Every constraint is the projection of (right vertex - left vertex) onto
+  # the normal of the spine total, so rather than evaluating all left x right
+  # pairs this takes the gap between the lowest right vertex and the highest
+  # left vertex along that normal, in time linear in the path length.
+  def feasibilityMargin(self, apex, powerTable=None):
+    (leftPositions, rightPositions, normal) = self.boundaryPositions(
+        apex, powerTable)
+    leftProjections = [p.dot(normal) for p in leftPositions]
+    rightProjections = [p.dot(normal) for p in rightPositions]
+    leftMax = max(leftProjections)
+    rightMin = min(rightProjections)
+    return (
+        rightMin - leftMax,
+        leftProjections.index(leftMax), rightProjections.index(rightMin))
+
+  # See FanPositions.
+  def fanPositions(self, apex, pg=None):
+    if pg is None:
+      pg = PathGeometryAngles(apex)
+    return FanPositions(self.fanRuns, pg)
+
+  # The same (margin, leftIndex, rightIndex) as feasibilityMargin, for a
+  # float apex, in time proportional to the number of fans rather than the
+  # number of turns (see FanFeasibilityMargin). margin is in the unnormalized
+  # units of PathGeometryAngles: feasibilityMargin's divided by the positive
+  # factor (norm0^maxAngles[0] * norm1^maxAngles[1])^2, so the sign is the
+  # same (checked in selfcheck.py).
+  def fanFeasibilityMargin(self, apex):
+    return FanFeasibilityMargin(self.fanRuns, apex)
+
+  # Like feasibilityMargin, but only considers the given left and right
+  # vertex indices (e.g. from activeConstraints): the boundary positions are
+  # found once, and only the active vertices are projected onto the normal.
+  def feasibilityMarginForPairs(
+      self, apex, leftIndices, rightIndices, powerTable=None):
+    (leftPositions, rightPositions, normal) = self.boundaryPositions(
+        apex, powerTable)
+    (leftMax, leftIndex) = max([
+        (leftPositions[l].dot(normal), -l) for l in leftIndices])
+    (rightMin, rightIndex) = min([
+        (rightPositions[r].dot(normal), r) for r in rightIndices])
+    return (rightMin - leftMax, -leftIndex, rightIndex)
+
+  # A cheap necessary condition for feasibility at apex, using only the fan
+  # runs of the path and the (cached) per-apex fan limits: if this returns
+  # false the path can't be feasible there, without ever building the
+  # geometry.
+  def passesAngleBound(self, apex):
+    limits = FanLimitsForApex(apex)
+    runs = self.maxFanRuns
+    return runs[0] <= limits[0] and runs[1] <= limits[1] and (
+        runs[2] <= limits[2])
+
+  # Returns [count of edge index 0, 1, 2] over the given path edges.
+  @staticmethod
+  def edgeIndexCounts(edges):
+    counts = [0, 0, 0]
+    for edge in edges:
+      counts[edge.edgeVector.edgeIndex] += 1
+    return counts
+
+  # Bounds the rounding error of the float difference of two projections
+  # onto the spine normal (a feasibilityMargin or constraint value) computed
+  # with powerTable, a normalized PathPowerTable for a float apex, where each
+  # projected vector is a sum of edge offsets whose edge indices are counted
+  # by edgeCounts. Returns None if the table couldn't be normalized (or not
+  # enough to keep every value a normal float).
+  # Every offset from PathGeometryRing has modulus |edge| * K with
+  # K = powerTable.offsetScale(maxAngles), and is a product of at most
+  # m = maxAngles[0] + maxAngles[1] + 10 complex or real factors, each
+  # contributing relative error below 3u (the power of 2 scalings add none).
+  # Sums of n terms add at most n u relative to the sum of their moduli, and
+  # the dot product 2u.
+  def roundingErrorBound(self, powerTable, edgeCounts):
+    if not powerTable.normalized:
+      return None
+    u = 2.0 ** -53
+    scale = powerTable.offsetScale(self.maxAngles)
+    lengths = [math.sqrt(edge.squaredLength()) for edge in powerTable.edges]
+    if not 1e-100 < scale < 1e100 or min(lengths) < 1e-100:
+      return None
+    spineCounts = self.spineEdgeCounts
+    vectorBound = scale * sum([c * l for (c, l) in zip(edgeCounts, lengths)])
+    normalBound = scale * sum([c * l for (c, l) in zip(spineCounts, lengths)])
+    delta = 3 * u * (self.maxAngles[0] + self.maxAngles[1] + 10)
+    relativeError = (
+        2 * delta + u * sum(edgeCounts) + u * sum(spineCounts) + 2 * u)
+    # A factor 2 for the difference of two projections, and another 2 to
+    # absorb the second order terms and the rounding of the bound itself.
+    return 4 * vectorBound * normalBound * relativeError
+
+  # Returns the sign of feasibilityMargin(apex) for the exact apex
+  # coordinates: 1 if the path is feasible there, -1 if not, 0 on the
+  # boundary. The margin is first computed in floats and accepted if it
+  # exceeds roundingErrorBound; otherwise it's redone with outward-rounded
+  # intervals, and only if those can't decide the sign either is it
+  # recomputed exactly with rationals (see signFilterStats). Both float
+  # tiers use normalized power tables, so long paths don't underflow.
+  # passesAngleBound isn't used to reject paths here: failing it rules out
+  # feasibility, but not a zero margin (e.g. when a base angle is exactly
+  # pi / 4, a run of 7 turns around it can still touch the boundary).
+  def feasibilitySign(self, apex):
+    signFilterStats.evaluations += 1
+    powerTable = PathPowerTable(apex, True)
+    margin = self.feasibilityMargin(apex, powerTable)[0]
+    bound = self.roundingErrorBound(powerTable, self.boundaryEdgeCounts)
+    if bound is not None and abs(margin) > bound:
+      return Sign(margin)
+
+    signFilterStats.intervalFallbacks += 1
+    intervalApex = IntervalApex(apex)
+    (leftPositions, rightPositions, normal) = self.boundaryPositions(
+        intervalApex, PathPowerTable(intervalApex, True))
+    leftProjections = [p.dot(normal) for p in leftPositions]
+    rightProjections = [p.dot(normal) for p in rightPositions]
+    if min([p.lo for p in rightProjections]) > max(
+        [p.hi for p in leftProjections]):
+      return 1
+    if min([p.hi for p in rightProjections]) < max(
+        [p.lo for p in leftProjections]):
+      return -1
+
+    signFilterStats.exactFallbacks += 1
+    return Sign(self.feasibilityMargin(ExactApex(apex))[0])
+
+  # Returns the sign of constraintFunctions(apex)(leftIndex, rightIndex),
+  # decided the same way as feasibilitySign. The spine path of the pair is
+  # found once and placed for each tier, without the rest of the boundary.
+  def constraintSign(self, apex, leftIndex, rightIndex):
+    signFilterStats.evaluations += 1
+    path = self.pairSpinePath(leftIndex, rightIndex)
+    powerTable = PathPowerTable(apex, True)
+    value = self.pairConstraint(apex, path, powerTable)
+    bound = self.roundingErrorBound(
+        powerTable, PathStudy.edgeIndexCounts(path))
+    if bound is not None and abs(value) > bound:
+      return Sign(value)
+
+    signFilterStats.intervalFallbacks += 1
+    intervalApex = IntervalApex(apex)
+    value = self.pairConstraint(
+        intervalApex, path, PathPowerTable(intervalApex, True))
+    if value.lo > 0:
+      return 1
+    if value.hi < 0:
+      return -1
+
+    signFilterStats.exactFallbacks += 1
+    return Sign(self.pairConstraint(ExactApex(apex), path))
+
+  # Finds the boundary vertices that can be extremal (and hence the
+  # constraint pairs that can be active) for apexes in
+  # region = (xmin, xmax, ymin, ymax).
+  # Returns (leftIndices, rightIndices, certified). The candidates are the
+  # vertices within slack (relative to the boundary's extent along the
+  # normal) of the extreme at any of samples x samples grid apexes. If
+  # certified is true, interval evaluation on the region, subdivided up to
+  # certifyDepth times, proved that every other vertex is dominated by a
+  # candidate everywhere in the region, so
+  #   feasibilityMarginForPairs(apex, leftIndices, rightIndices)
+  # equals feasibilityMargin(apex) for every apex in it.
+  # Results are cached per (region, parameters) on the study, so they go
+  # away with it.
+  def activeConstraints(
+      self, region, samples=8, slack=0.05, certifyDepth=4):
+    key = (tuple(region), samples, slack, certifyDepth)
+    if key in self.activeConstraintsCache:
+      return self.activeConstraintsCache[key]
+
+    (xmin, xmax, ymin, ymax) = region
+    leftActive = set()
+    rightActive = set()
+    for i in range(samples):
+      x = xmin + (xmax - xmin) * i / float(max(samples - 1, 1))
+      for j in range(samples):
+        y = ymin + (ymax - ymin) * j / float(max(samples - 1, 1))
+        (leftPositions, rightPositions, normal) = self.boundaryPositions(
+            Coords2d(x, y))
+        leftProjections = [p.dot(normal) for p in leftPositions]
+        rightProjections = [p.dot(normal) for p in rightPositions]
+        leftMax = max(leftProjections)
+        rightMin = min(rightProjections)
+        tolerance = slack * (
+            leftMax - min(leftProjections) + max(rightProjections) - rightMin)
+        for l in range(len(leftProjections)):
+          if leftProjections[l] >= leftMax - tolerance:
+            leftActive.add(l)
+        for r in range(len(rightProjections)):
+          if rightProjections[r] <= rightMin + tolerance:
+            rightActive.add(r)
+
+    leftIndices = sorted(leftActive)
+    rightIndices = sorted(rightActive)
+    prunedLeft = [
+        l for l in range(len(self.leftVertices)) if l not in leftActive]
+    prunedRight = [
+        r for r in range(len(self.rightVertices)) if r not in rightActive]
+    certified = self.certifyDominance(
+        region, leftIndices, rightIndices, prunedLeft, prunedRight,
+        certifyDepth)
+    result = (leftIndices, rightIndices, certified)
+    self.activeConstraintsCache[key] = result
+    return result
+
+  # Returns true if, everywhere in region, each vertex in prunedLeft is
+  # below some vertex of leftIndices along the spine normal and each vertex
+  # in prunedRight is above some vertex of rightIndices. Subcells where the
+  # interval bounds are too loose are split in four, up to depth times.
+  def certifyDominance(
+      self, region, leftIndices, rightIndices, prunedLeft, prunedRight, depth):
+    if len(prunedLeft) == 0 and len(prunedRight) == 0:
+      return True
+    (xmin, xmax, ymin, ymax) = region
+    apex = Coords2d(Interval(xmin, xmax), Interval(ymin, ymax))
+    (leftPositions, rightPositions, normal) = self.boundaryPositions(apex)
+
+    def dominated(i, positions, candidates, sign):
+      for j in candidates:
+        gap = (positions[j] - positions[i]).dot(normal)
+        if (gap.lo if sign > 0 else -gap.hi) >= 0:
+          return True
+      return False
+
+    prunedLeft = [
+        l for l in prunedLeft
+        if not dominated(l, leftPositions, leftIndices, 1)]
+    prunedRight = [
+        r for r in prunedRight
+        if not dominated(r, rightPositions, rightIndices, -1)]
+    if len(prunedLeft) == 0 and len(prunedRight) == 0:
+      return True
+    if depth == 0:
+      return False
+    xmid = (xmin + xmax) / 2.0
+    ymid = (ymin + ymax) / 2.0
+    for subregion in [
+        (xmin, xmid, ymin, ymid), (xmid, xmax, ymin, ymid),
+        (xmin, xmid, ymid, ymax), (xmid, xmax, ymid, ymax)]:
+      if not self.certifyDominance(
+          subregion, leftIndices, rightIndices, prunedLeft, prunedRight,
+          depth - 1):
+        return False
+    return True
 
   def countForm(self):
     results = []
@@ -495,6 +1545,64 @@ class PathStudy:
 
     return PathCountForm(results)
 
+# Screens a corpus of paths against one apex: returns [(study, margin)] for
+# every study whose feasibilityMargin at apex is positive, in input order.
+# Paths the angle bound rules out are dropped without building any geometry,
+# and the rest are evaluated in order of increasing maxAngles against one
+# shared PathPowerTable, so the powers of the base rotations are computed
+# once for the whole corpus (up to the largest maxAngles that survives the
+# bound) instead of once per path.
+def ScreenPathStudiesAtApex(studies, apex, powerTable=None):
+  if powerTable is None:
+    powerTable = PathPowerTable(apex)
+  candidates = [
+      (i, study) for (i, study) in enumerate(studies)
+      if study.passesAngleBound(apex)]
+  candidates.sort(key=lambda c: c[1].maxAngles[0] + c[1].maxAngles[1])
+  feasible = []
+  for (i, study) in candidates:
+    margin = study.feasibilityMargin(apex, powerTable)[0]
+    if margin > 0:
+      feasible.append((i, study, margin))
+  feasible.sort(key=lambda f: f[0])
+  return [(study, margin) for (i, study, margin) in feasible]
+
+# Pool worker for ScreenEdgePathsAtApex; each worker process keeps one power
+# table for the apex across all of its chunks.
+screenPowerTable = None
+
+def InitScreenWorker(x, y):
+  global screenPowerTable
+  screenPowerTable = PathPowerTable(Coords2d(x, y))
+
+def ScreenEdgePathChunk(edgePaths):
+  apex = screenPowerTable.apex
+  studies = [PathStudy(edgePath) for edgePath in edgePaths]
+  return [
+      (study.path, margin)
+      for (study, margin) in ScreenPathStudiesAtApex(
+          studies, apex, screenPowerTable)]
+
+# Like ScreenPathStudiesAtApex for a list of (canonical) edge paths, returning
+# [(edgePath, margin)]. With processes > 1 the paths are split into chunks
+# that are screened in a multiprocessing pool.
+def ScreenEdgePathsAtApex(edgePaths, apex, processes=1, chunkSize=1000):
+  if processes <= 1:
+    studies = [PathStudy(edgePath) for edgePath in edgePaths]
+    return [
+        (study.path, margin)
+        for (study, margin) in ScreenPathStudiesAtApex(studies, apex)]
+  chunks = [
+      edgePaths[i:i + chunkSize] for i in range(0, len(edgePaths), chunkSize)]
+  pool = multiprocessing.Pool(
+      processes, InitScreenWorker, (apex.x, apex.y))
+  try:
+    results = pool.map(ScreenEdgePathChunk, chunks)
+  finally:
+    pool.close()
+    pool.join()
+  return [result for chunkResults in results for result in chunkResults]
+
 def GCD(a, b):
   if b == 0:
     return abs(a)
@@ -526,9 +1634,9 @@ class PathCountForm:
     newCounts = []
     for i in range(len(self.counts)):
       if i % 2 == 0:
-        newCounts.append(self.counts[i] / evenGCD)
+        newCounts.append(self.counts[i] // evenGCD)
       else:
-        newCounts.append(self.counts[i] / oddGCD)
+        newCounts.append(self.counts[i] // oddGCD)
     return PathCountForm(newCounts)
 
 # /Users/fae/Programming/code/swift/BilliardSearch/Data/pathlength-24.txt
@@ -541,36 +1649,24 @@ class Fan:
     self.startsOnBaseEdge = startsOnBaseEdge
     self.length = 1
 
+# A fan starting on the base edge has length 1 when it starts, one more per
+# turn until the next fan starts and one more for that turn; a fan starting
+# off the base edge starts with length 2. The last fan wraps around to the
+# start of the first one.
 def FansForEdgePath(edgePath):
-  curFan = None
+  fanStarts = ScanEdgePath(edgePath)[1]
   fans = []
-  prevTurn = edgePath[-1]
-  prevReflectingEdgeIndex = 0
-  paritySign = 1
-  for i, turn in enumerate(edgePath):
-    turnSign = -1 if turn == "L" else 1
-    reflectingEdgeIndex = (prevReflectingEdgeIndex + turnSign * paritySign) % 3
-    if reflectingEdgeIndex != 0 and prevReflectingEdgeIndex != 0:
-      if curFan:
-        curFan.length += 1
-        fans.append(curFan)
-      curFan = Fan(i, reflectingEdgeIndex % 2, turnSign, True)
-    elif prevTurn == turn or reflectingEdgeIndex == 0:
-      if curFan:
-        curFan.length += 1
+  for (k, (i, angleIndex, orientation, startsOnBaseEdge)) in enumerate(
+      fanStarts):
+    fan = Fan(i, angleIndex, orientation, startsOnBaseEdge)
+    if k + 1 < len(fanStarts):
+      end = fanStarts[k + 1][0]
     else:
-      if curFan:
-        curFan.length += 1
-        fans.append(curFan)
-      curFan = Fan(i, reflectingEdgeIndex  % 2, -turnSign, False)
-      curFan.length += 1
-    prevTurn = turn
-    paritySign = -paritySign
-    prevReflectingEdgeIndex = reflectingEdgeIndex
-  if curFan:
-    if len(fans) > 0:
-      curFan.length += fans[0].pathIndex + 1
-    fans.append(curFan)
+      end = len(edgePath) - 1
+      if k > 0:
+        end += fans[0].pathIndex + 1
+    fan.length = end - i + (1 if startsOnBaseEdge else 2)
+    fans.append(fan)
   return fans
 
 def PickCanonicalCountIndex(counts, indices):
@@ -605,7 +1701,7 @@ def CountsForEdgePath(edgePath):
       elif fan.length == bestLength:
         startIndices.append(len(counts))
     offset = 0 if fan.startsOnBaseEdge else -1
-    baseLength = (fan.length + offset) / 2
+    baseLength = (fan.length + offset) // 2
     counts.append(paritySign * fan.orientation * baseLength)
     paritySign = -paritySign
   cf = PathCountForm(counts)
@@ -613,6 +1709,131 @@ def CountsForEdgePath(edgePath):
   sliceIndex = PickCanonicalCountIndex(ancestor.counts, startIndices)
   return counts[sliceIndex:] + counts[:sliceIndex]
 
+# Turns are the (singularity, degree) pairs of a Swift TurnPath / TurnCycle:
+# singularity 0 (B0) or 1 (B1), the same as Fan.angleIndex, and a nonzero
+# degree counting the reflections around that base vertex, widdershins
+# positive for B0 and clockwise positive for B1. Consecutive turns around the
+# same singularity aren't merged here.
+#
+# Returns the edge path of the cyclic turn sequence, starting on the base edge
+# like the edge paths in the data files, or None if it doesn't close up in the
+# given orientation (see EdgePathForTurns).
+def EdgePathForOrientedTurns(turns):
+  # The reflecting edge indices of the whole cycle: 2 is the edge B0-apex,
+  # 1 the edge B1-apex and 0 the base edge. Two turns of the same sign meet
+  # through the base edge, opposite signs meet through the apex.
+  hits = []
+  prevDegree = turns[-1][1]
+  for (singularity, degree) in turns:
+    edgeIndex = 2 if singularity == 0 else 1
+    if (degree > 0) == (prevDegree > 0):
+      hits.append(0)
+    hits.append(edgeIndex)
+    for i in range(abs(degree) - 1):
+      hits.append(0)
+      hits.append(edgeIndex)
+    prevDegree = degree
+  # The first reflection of the first turn has the parity of its degree; an
+  # edge path starts just after a base edge reflection of parity -1.
+  firstIndex = 1 if hits[0] == 0 else 0
+  firstParity = 1 if turns[0][1] > 0 else -1
+  start = None
+  for i in range(len(hits)):
+    parity = firstParity if (i - firstIndex) % 2 == 0 else -firstParity
+    if hits[i] == 0 and parity == -1:
+      start = i + 1
+      break
+  if start is None:
+    return None
+  edgePath = []
+  prevEdgeIndex = 0
+  paritySign = 1
+  for edgeIndex in hits[start:] + hits[:start]:
+    edgePath.append(
+        "R" if (edgeIndex - prevEdgeIndex) * paritySign % 3 == 1 else "L")
+    prevEdgeIndex = edgeIndex
+    paritySign = -paritySign
+  return "".join(edgePath)
+
+# Returns the edge path of a cyclic turn sequence, for PathStudy and the
+# other edge path functions. A cycle that only closes up in the opposite
+# orientation is converted with its degrees negated, which is the same
+# trajectory traversed the other way. Raises ValueError if neither works,
+# which can't happen when the degrees around each singularity cancel.
+def EdgePathForTurns(turns):
+  if len(turns) == 0:
+    raise ValueError("empty turn sequence")
+  edgePath = EdgePathForOrientedTurns(turns)
+  if edgePath is None:
+    edgePath = EdgePathForOrientedTurns(
+        [(singularity, -degree) for (singularity, degree) in turns])
+  if edgePath is None:
+    raise ValueError("turn sequence isn't a cycle: " + str(turns))
+  return edgePath
+
+# Returns the turns of the cycle traced by edgePath, one per fan of
+# FansForEdgePath; the inverse of EdgePathForTurns up to rotation (and up to
+# the sign of every degree, for turns EdgePathForTurns had to negate).
+def TurnsForEdgePath(edgePath):
+  turns = []
+  prevEdgeIndex = 0
+  paritySign = 1
+  for turn in edgePath:
+    turnSign = -1 if turn == "L" else 1
+    edgeIndex = (prevEdgeIndex + turnSign * paritySign) % 3
+    if edgeIndex != 0:
+      singularity = 0 if edgeIndex == 2 else 1
+      if len(turns) > 0 and turns[-1][0] == singularity:
+        turns[-1][1] += paritySign
+      else:
+        turns.append([singularity, paritySign])
+    prevEdgeIndex = edgeIndex
+    paritySign = -paritySign
+  # The path starts in the middle of a fan when its first and last
+  # reflections are around the same singularity.
+  if len(turns) > 1 and turns[0][0] == turns[-1][0]:
+    turns[0][1] += turns.pop()[1]
+  return [tuple(turn) for turn in turns]
+
+# Returns an edge path with the given counts, exactly as CountsForEdgePath
+# returns them (which rotation it picks can depend on where the edge path
+# starts, so both the path as built and its canonical form are tried), or None
+# if there is none. The counts are the degrees of the turns up to rotation and
+# the sign of all of them, and turns alternate singularities, so only the
+# singularity of the first turn and the sign need to be found. Different paths
+# can share a count form; this returns the first one found. Only count forms of
+# canonical paths (as PathConverter produces them) are sure to be found again:
+# a rotation that doesn't start where the canonical path does can have counts
+# that no path built from them reproduces.
+def EdgePathForCounts(counts):
+  counts = list(counts)
+  if len(counts) == 0 or 0 in counts:
+    return None
+  for singularity in [0, 1]:
+    for sign in [1, -1]:
+      edgePath = EdgePathForOrientedTurns([
+          ((singularity + i) % 2, sign * count)
+          for (i, count) in enumerate(counts)])
+      if edgePath is None:
+        continue
+      # CountsForEdgePath needs a canonical start to pick its rotation from;
+      # paths without one aren't canonical paths of any trajectory.
+      starts = CanonicalStartIndices(edgePath)
+      if len(starts) == 0:
+        continue
+      if CountsForEdgePath(edgePath) == counts:
+        return edgePath
+      canonical = min([edgePath[i:] + edgePath[:i] for i in starts])
+      if CountsForEdgePath(canonical) == counts:
+        return canonical
+  return None
+
+def TurnsForCounts(counts):
+  edgePath = EdgePathForCounts(counts)
+  if edgePath is None:
+    return None
+  return TurnsForEdgePath(edgePath)
+
 
 #PathStats(
 #    "/Users/fae/Programming/code/swift/BilliardSearch/Data/pathlength-all.txt")
@@ -761,111 +1982,695 @@ cf(0, 1).factor() # left
 cf(14, 0).factor() # right
 
 """
-allPathStats = {}
+# Assigns each distinct count form a dense integer id, so per-path state can
+# be indexed by id instead of by the (much larger) string form of its counts.
+# The counts of every interned form are stored back to back in one packed
+# array; lookups go through a 64-bit fingerprint of the counts, and every
+# fingerprint hit is checked against the stored counts so that colliding
+# forms still get distinct ids.
+class PathInterner:
+  def __init__(self):
+    # The counts for id i are packedCounts[offsets[i]:offsets[i+1]].
+    self.packedCounts = array('l')
+    self.offsets = array('l', [0])
+    # fingerprint -> id of the first form interned with that fingerprint.
+    self.idForFingerprint = {}
+    # fingerprint -> [id], only for fingerprints shared by several forms.
+    self.collisions = {}
+
+  def __len__(self):
+    return len(self.offsets) - 1
 
-class PathStats:
-  def __init__(self, counts):
-    self.path = PathCountForm(counts)
-    self.pathStr = str(self.path)
+  @staticmethod
+  def fingerprint(counts):
+    return hash(tuple(counts)) & 0xFFFFFFFFFFFFFFFF
+
+  def countsForId(self, pathId):
+    return self.packedCounts[
+        self.offsets[pathId]:self.offsets[pathId + 1]].tolist()
+
+  def countsMatchId(self, counts, pathId):
+    start = self.offsets[pathId]
+    if self.offsets[pathId + 1] - start != len(counts):
+      return False
+    for i in range(len(counts)):
+      if self.packedCounts[start + i] != counts[i]:
+        return False
+    return True
+
+  # Returns the id of the given counts, or None if they were never interned.
+  def idForCounts(self, counts):
+    fingerprint = PathInterner.fingerprint(counts)
+    pathId = self.idForFingerprint.get(fingerprint)
+    if pathId is None or self.countsMatchId(counts, pathId):
+      return pathId
+    for otherId in self.collisions.get(fingerprint, []):
+      if self.countsMatchId(counts, otherId):
+        return otherId
+    return None
+
+  def internCounts(self, counts):
+    pathId = self.idForCounts(counts)
+    if pathId is not None:
+      return pathId
+    pathId = len(self)
+    self.packedCounts.extend(counts)
+    self.offsets.append(len(self.packedCounts))
+    fingerprint = PathInterner.fingerprint(counts)
+    if fingerprint in self.idForFingerprint:
+      self.collisions.setdefault(fingerprint, []).append(pathId)
+    else:
+      self.idForFingerprint[fingerprint] = pathId
+    return pathId
 
-    ancestorPath = self.path.minimalAncestor()
-    if self.path != ancestorPath:
+pathInterner = PathInterner()
+
+# An edge path packed one bit per turn (L = 0, R = 1) into an int, first turn
+# in the highest bit. It supports what the edge path functions use of a
+# string -- len, indexing, slicing, +, iteration, comparison (ordered like the
+# strings) and hashing -- so it can be passed to them in place of one, and
+# the paths they return are packed too. str() unpacks it.
+class PackedEdgePath(object):
+  __slots__ = ["length", "bits"]
+
+  def __init__(self, length, bits):
+    self.length = length
+    self.bits = bits
+
+  @staticmethod
+  def fromString(edgePath):
+    if len(edgePath) == 0:
+      return PackedEdgePath(0, 0)
+    return PackedEdgePath(
+        len(edgePath), int(edgePath.replace("L", "0").replace("R", "1"), 2))
+
+  def __str__(self):
+    if self.length == 0:
+      return ""
+    digits = format(self.bits, "b").zfill(self.length)
+    return digits.replace("0", "L").replace("1", "R")
+
+  def __repr__(self):
+    return "PackedEdgePath(" + str(self) + ")"
+
+  def __len__(self):
+    return self.length
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      (start, stop, step) = index.indices(self.length)
+      if step != 1:
+        return PackedEdgePath.fromString(str(self)[index])
+      stop = max(start, stop)
+      length = stop - start
+      return PackedEdgePath(
+          length, (self.bits >> (self.length - stop)) & ((1 << length) - 1))
+    if index < 0:
+      index += self.length
+    if index < 0 or index >= self.length:
+      raise IndexError("edge path index out of range")
+    return "R" if (self.bits >> (self.length - 1 - index)) & 1 else "L"
+
+  def __iter__(self):
+    return iter(str(self))
+
+  # The ScanChunkKey of each byte of turns (the last one possibly shorter),
+  # for ScanEdgePath.
+  def scanChunkKeys(self):
+    if self.length == 0:
+      return []
+    padding = -self.length % 8
+    packed = bytearray(binascii.unhexlify(
+        format(self.bits << padding, "x").zfill((self.length + padding) // 4)))
+    keys = [ScanChunkKey(8, byte) for byte in packed]
+    if padding > 0:
+      keys[-1] = ScanChunkKey(8 - padding, packed[-1] >> padding)
+    return keys
+
+  def __add__(self, other):
+    return PackedEdgePath(
+        self.length + other.length, (self.bits << other.length) | other.bits)
+
+  # The path starting offset turns in, wrapping around.
+  def rotated(self, offset):
+    offset %= max(self.length, 1)
+    return self[offset:] + self[:offset]
+
+  # Every L swapped with R and the order reversed; see MirrorEdgePath.
+  def swappedAndReversed(self):
+    if self.length == 0:
+      return self
+    flipped = self.bits ^ ((1 << self.length) - 1)
+    return PackedEdgePath(
+        self.length, int(format(flipped, "b").zfill(self.length)[::-1], 2))
+
+  # Returns -1, 0 or 1 as self sorts before, with or after other.
+  def compare(self, other):
+    common = min(self.length, other.length)
+    a = self.bits >> (self.length - common)
+    b = other.bits >> (other.length - common)
+    if a != b:
+      return -1 if a < b else 1
+    return (self.length > other.length) - (self.length < other.length)
+
+  def __eq__(self, other):
+    return (isinstance(other, PackedEdgePath) and
+        self.length == other.length and self.bits == other.bits)
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __lt__(self, other):
+    return self.compare(other) < 0
+
+  def __le__(self, other):
+    return self.compare(other) <= 0
+
+  def __gt__(self, other):
+    return self.compare(other) > 0
+
+  def __ge__(self, other):
+    return self.compare(other) >= 0
+
+  def __hash__(self):
+    return hash((self.length, self.bits))
+
+# A list of edge paths in one shared bit buffer, like PathInterner's counts:
+# path i is bits offsets[i] to offsets[i+1] of packedTurns (most significant
+# bit of each byte first). For a corpus of 30-turn paths this takes about an
+# eighth of the memory of the strings with their per-object overhead.
+class PackedEdgePaths:
+  def __init__(self):
+    self.packedTurns = bytearray()
+    self.offsets = array('l', [0])
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  # Appends an edge path (a string or a PackedEdgePath) and returns its index.
+  def append(self, edgePath):
+    if not isinstance(edgePath, PackedEdgePath):
+      edgePath = PackedEdgePath.fromString(edgePath)
+    start = self.offsets[-1]
+    length = edgePath.length
+    bits = edgePath.bits
+    # Merge with the bits already in the last, partially used byte.
+    used = start % 8
+    if used > 0:
+      bits |= (self.packedTurns.pop() >> (8 - used)) << length
+      length += used
+    padding = -length % 8
+    if length > 0:
+      self.packedTurns += binascii.unhexlify(
+          format(bits << padding, "x").zfill((length + padding) // 4))
+    self.offsets.append(start + edgePath.length)
+    return len(self) - 1
+
+  def __getitem__(self, i):
+    if i < 0:
+      i += len(self)
+    start = self.offsets[i]
+    end = self.offsets[i + 1]
+    if end == start:
+      return PackedEdgePath(0, 0)
+    firstByte = start // 8
+    endByte = (end + 7) // 8
+    bits = int(binascii.hexlify(
+        bytes(self.packedTurns[firstByte:endByte])), 16)
+    return PackedEdgePath(
+        end - start, (bits >> (endByte * 8 - end)) & ((1 << (end - start)) - 1))
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+# PathStats indexed by their id in pathInterner.
+allPathStats = []
+# Whether PathStats keep every data point (see CoordsSummary); only
+# PrintPathStatsCsv needs them. Off by default, since a checkpoint of them
+# (see checkpoint.py) grows with every point ever added and is rewritten in
+# full on every save.
+keepAllCoords = False
+
+# Discards all accumulated PathStats.
+def ResetPathStats(keepCoords=False):
+  global pathInterner, keepAllCoords
+  pathInterner = PathInterner()
+  keepAllCoords = keepCoords
+  del allPathStats[:]
+
+# Memo for CountsForEdgePath, since the same paths recur across many rows and
+# input files. It is dropped whenever it grows past countsCacheLimit entries,
+# so its memory stays bounded no matter how large the corpus is.
+countsCache = {}
+countsCacheLimit = 1 << 16
+
+def CachedCountsForEdgePath(edgePath):
+  counts = countsCache.get(edgePath)
+  if counts is None:
+    if len(countsCache) >= countsCacheLimit:
+      countsCache.clear()
+    counts = CountsForEdgePath(edgePath)
+    countsCache[edgePath] = counts
+  return counts
+
+symmetricCountsCache = {}
+
+def CachedSymmetricCountsForEdgePath(edgePath):
+  result = symmetricCountsCache.get(edgePath)
+  if result is None:
+    if len(symmetricCountsCache) >= countsCacheLimit:
+      symmetricCountsCache.clear()
+    result = SymmetricCountsForEdgePath(edgePath)
+    symmetricCountsCache[edgePath] = result
+  return result
+
+# The number of sign changes between cyclically adjacent fan counts.
+def FlipCountForCounts(counts):
+  flipCount = 0
+  for i in range(len(counts)):
+    if counts[i] * counts[(i + 1) % len(counts)] < 0:
+      flipCount += 1
+  return flipCount
+
+# The convex hull of a list of (x, y) tuples, counterclockwise, without
+# collinear points (Andrew's monotone chain).
+def ConvexHull(points):
+  points = sorted(set(points))
+  if len(points) < 3:
+    return points
+  def cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+  lower = []
+  for p in points:
+    while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+      lower.pop()
+    lower.append(p)
+  upper = []
+  for p in reversed(points):
+    while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+      upper.pop()
+    upper.append(p)
+  return lower[:-1] + upper[:-1]
+
+# Whether (x, y) is inside or on the counterclockwise convex polygon hull.
+def HullContains(hull, x, y):
+  if len(hull) < 3:
+    return (x, y) in hull
+  previous = hull[-1]
+  for p in hull:
+    if ((p[0] - previous[0]) * (y - previous[1]) -
+        (p[1] - previous[1]) * (x - previous[0])) < 0:
+      return False
+    previous = p
+  return True
+
+# A square (x min, x max, y min, y max) inside the counterclockwise convex
+# polygon hull, centred on its vertex mean and as large as that allows; empty
+# if hull has no interior.
+def InnerSquare(hull):
+  if len(hull) < 3:
+    return (1, 0, 1, 0)
+  cx = sum([p[0] for p in hull]) / float(len(hull))
+  cy = sum([p[1] for p in hull]) / float(len(hull))
+  halfWidth = float("inf")
+  previous = hull[-1]
+  for p in hull:
+    # (a, b) is the inward normal of the edge from previous to p, and the
+    # square of half width w around c is inside that edge as long as
+    # a (cx - px) + b (cy - py) >= (|a| + |b|) w.
+    a = previous[1] - p[1]
+    b = p[0] - previous[0]
+    halfWidth = min(
+        halfWidth, (a * (cx - p[0]) + b * (cy - p[1])) / (abs(a) + abs(b)))
+    previous = p
+  return (cx - halfWidth, cx + halfWidth, cy - halfWidth, cy + halfWidth)
+
+# Seeded, so that reservoir samples are reproducible from run to run.
+reservoirRandom = random.Random(0)
+
+# An online summary of the data point coords of one path, using constant
+# memory however many points are added: their count, bounding box and sums
+# (for the centroid), their convex hull (whose size only grows with the
+# number of extreme points, which is small for apexes filling a region), and
+# a uniform reservoir sample of up to sampleSize points. If keepAll is true,
+# every point is also kept, packed into a float64 array of x, y pairs.
+class CoordsSummary(object):
+  __slots__ = [
+      "count", "xMin", "xMax", "yMin", "yMax", "xSum", "ySum", "hull",
+      "inner", "sample", "all"]
+
+  sampleSize = 32
+
+  def __init__(self, keepAll=False):
+    self.count = 0
+    self.xMin = self.yMin = float("inf")
+    self.xMax = self.yMax = float("-inf")
+    self.xSum = self.ySum = 0.0
+    self.setHull([])
+    self.sample = []
+    self.all = array("d") if keepAll else None
+
+  # inner is a square inside the hull, so most points (the ones inside it)
+  # are known to be inside the hull without testing every edge.
+  def setHull(self, hull):
+    self.hull = hull
+    self.inner = InnerSquare(hull)
+
+  def add(self, x, y):
+    self.count += 1
+    outside = False
+    if x < self.xMin:
+      (self.xMin, outside) = (x, True)
+    if x > self.xMax:
+      (self.xMax, outside) = (x, True)
+    if y < self.yMin:
+      (self.yMin, outside) = (y, True)
+    if y > self.yMax:
+      (self.yMax, outside) = (y, True)
+    self.xSum += x
+    self.ySum += y
+    inner = self.inner
+    if not (inner[0] <= x <= inner[1] and inner[2] <= y <= inner[3]) and (
+        outside or not HullContains(self.hull, x, y)):
+      self.setHull(ConvexHull(self.hull + [(x, y)]))
+    if len(self.sample) < CoordsSummary.sampleSize:
+      self.sample.append((x, y))
+    else:
+      i = reservoirRandom.randrange(self.count)
+      if i < CoordsSummary.sampleSize:
+        self.sample[i] = (x, y)
+    if self.all is not None:
+      self.all.append(x)
+      self.all.append(y)
+
+  # Folds in another summary, as if its points had been added to this one.
+  # The merged sample is still uniform: each slot is filled from one side or
+  # the other with probability proportional to the number of that side's
+  # points not yet drawn.
+  def merge(self, other):
+    if other.count == 0:
+      return
+    self.xMin = min(self.xMin, other.xMin)
+    self.xMax = max(self.xMax, other.xMax)
+    self.yMin = min(self.yMin, other.yMin)
+    self.yMax = max(self.yMax, other.yMax)
+    self.xSum += other.xSum
+    self.ySum += other.ySum
+    self.setHull(ConvexHull(self.hull + other.hull))
+    mine = list(self.sample)
+    theirs = list(other.sample)
+    reservoirRandom.shuffle(mine)
+    reservoirRandom.shuffle(theirs)
+    (myCount, theirCount) = (self.count, other.count)
+    sample = []
+    while len(sample) < CoordsSummary.sampleSize and (mine or theirs):
+      if theirs and (not mine or
+          reservoirRandom.randrange(myCount + theirCount) >= myCount):
+        sample.append(theirs.pop())
+        theirCount -= 1
+      else:
+        sample.append(mine.pop())
+        myCount -= 1
+    self.sample = sample
+    self.count += other.count
+    if self.all is not None:
+      if other.all is None:
+        raise ValueError("can't merge coords summaries without all points")
+      self.all.extend(other.all)
+
+  def centroid(self):
+    return Coords2d(self.xSum / self.count, self.ySum / self.count)
+
+  # Every point added, as Coords2d (only if keepAll was set).
+  def points(self):
+    if self.all is None:
+      raise ValueError("coords summary doesn't keep all points")
+    return [
+        Coords2d(self.all[i], self.all[i + 1])
+        for i in range(0, len(self.all), 2)]
+
+class PathStats(object):
+  __slots__ = [
+      "pathId", "ancestor", "dataPoints", "coords",
+      "descendantDataPoints", "flipCount"]
+
+  def __init__(self, pathId):
+    self.pathId = pathId
+    counts = pathInterner.countsForId(pathId)
+
+    ancestorPath = PathCountForm(counts).minimalAncestor()
+    if ancestorPath.counts != counts:
       self.ancestor = PathStats.statsForPath(ancestorPath)
     else:
       self.ancestor = None
 
     self.dataPoints = 0
-    self.coordsList = []
+    self.coords = CoordsSummary(keepAllCoords)
     self.descendantDataPoints = 0
 
-    flipCount = 0
-    for i in range(len(counts)):
-      if counts[i] * counts[(i + 1) % len(counts)] < 0:
-        flipCount += 1
-    self.flipCount = flipCount
+    self.flipCount = FlipCountForCounts(counts)
+
+  # The count form and its string are rebuilt from the interner on demand
+  # rather than stored per path.
+  @property
+  def path(self):
+    return PathCountForm(pathInterner.countsForId(self.pathId))
+
+  @property
+  def pathStr(self):
+    return str(self.path)
 
   @staticmethod
   def statsForPath(path):
-    pathStr = str(path)
-
-    if pathStr not in allPathStats:
-      allPathStats[pathStr] = PathStats(path.counts)
-    return allPathStats[pathStr]
+    pathId = pathInterner.internCounts(path.counts)
+    if pathId == len(allPathStats):
+      # Reserve the slot before constructing, since the constructor may
+      # intern (and append stats for) the minimal ancestor.
+      allPathStats.append(None)
+      allPathStats[pathId] = PathStats(pathId)
+    return allPathStats[pathId]
+
+
+# Iterates over the lines of a file starting at a byte offset, keeping in
+# offset the position just past the last line read, so a later pass can pick
+# up where this one stopped. If completeOnly is true, a final line without a
+# newline (one that is still being written) is left for the next pass.
+class LineCursor:
+  def __init__(self, filename, offset=0, completeOnly=False):
+    self.filename = filename
+    self.offset = offset
+    self.completeOnly = completeOnly
+
+  def __iter__(self):
+    with open(self.filename, "rb") as f:
+      f.seek(self.offset)
+      for line in f:
+        if self.completeOnly and not line.endswith(b"\n"):
+          return
+        self.offset += len(line)
+        if not isinstance(line, str):
+          line = line.decode("latin-1")
+        yield line
+
+# Because we accidentally printed a garbage trailing ')' at the end of the
+# path in many data files >_< -- strips everything but the turns from a path
+# field with one regular expression pass, the same clean CsvPathRowReader
+# applies to whole blocks, rather than a Python loop over its characters.
+nonTurnPattern = re.compile("[^LR]+")
+
+def CleanEdgePath(s):
+  return nonTurnPattern.sub("", s)
+
+# Reads x,y,path,... rows (as in the success CSVs) in large blocks, yielding
+# them in batches of (x array, y array, path list). Each block is split into
+# rows with one regular expression pass and its paths are cleaned with
+# bytes.translate, so the per-row work left in Python is just the float
+# conversions. Rows with fewer than three columns (such as those of the fail
+# CSVs) are skipped, and so are rows whose coords aren't numbers. Like
+# LineCursor, reading starts at a byte offset and offset is kept just past
+# the last batch consumed.
+class CsvPathRowReader:
+  rowPattern = re.compile(b"^([^,\n]*),([^,\n]*),([^,\n]*)", re.M)
+  nonTurnPattern = re.compile(b"[^LR\n]+")
+
+  def __init__(self, filename, offset=0, completeOnly=False, blockSize=1 << 22):
+    self.filename = filename
+    self.offset = offset
+    self.completeOnly = completeOnly
+    self.blockSize = blockSize
+
+  def __iter__(self):
+    with open(self.filename, "rb") as f:
+      f.seek(self.offset)
+      pending = b""
+      while True:
+        block = f.read(self.blockSize)
+        if len(block) == 0:
+          break
+        block = pending + block
+        end = block.rfind(b"\n") + 1
+        (block, pending) = (block[:end], block[end:])
+        if end > 0:
+          yield CsvPathRowReader.parse(block)
+          self.offset += end
+      if len(pending) > 0 and not self.completeOnly:
+        yield CsvPathRowReader.parse(pending)
+        self.offset += len(pending)
 
+  @staticmethod
+  def parse(block):
+    # Because we accidentally printed a garbage trailing ')' at the end of the
+    # path in many data files >_< (none of the other columns have any).
+    rows = CsvPathRowReader.rowPattern.findall(block.translate(None, b")"))
+    try:
+      xs = array("d", map(float, [row[0] for row in rows]))
+      ys = array("d", map(float, [row[1] for row in rows]))
+    except ValueError:
+      # Headers and other stray lines are rare, so only then go row by row.
+      rows = [row for row in rows if CsvPathRowReader.isNumericRow(row)]
+      xs = array("d", map(float, [row[0] for row in rows]))
+      ys = array("d", map(float, [row[1] for row in rows]))
+    if len(rows) == 0:
+      return (xs, ys, [])
+    paths = b"\n".join([row[2] for row in rows])
+    if len(paths.translate(None, b"LR\n")) > 0:
+      paths = CsvPathRowReader.nonTurnPattern.sub(b"", paths)
+    if not isinstance(paths, str):
+      paths = paths.decode("latin-1")
+    return (xs, ys, paths.split("\n"))
 
-def PathStatsForTextFile(filename):
-  with open(filename) as f:
-    for line in f:
-      # Because we accidentally printed a garbage trailing ')' at the end of the
-      # path in many data files >_<
-      pathStr = "".join([c for c in edgePath if c == 'L' or c == 'R'])
-      counts = CountsForEdgePath(pathStr)
-      cf = PathCountForm(counts)
-      stats = PathStats.statsForPath(cf)
-      stats.dataPoints += 1
-      if stats.ancestor:
-        stats.ancestor.descendantDataPoints += 1
-
-      #minimalPaths[str(mf)] = 1
+  @staticmethod
+  def isNumericRow(row):
+    try:
+      float(row[0])
+      float(row[1])
+    except ValueError:
+      return False
+    return True
+
+def AddEdgePathToPathStats(pathStr, mirror=False):
+  if mirror:
+    (counts, mirrored) = CachedSymmetricCountsForEdgePath(pathStr)
+  else:
+    (counts, mirrored) = (CachedCountsForEdgePath(pathStr), False)
+  stats = PathStats.statsForPath(PathCountForm(counts))
+  stats.dataPoints += 1
+  if stats.ancestor:
+    stats.ancestor.descendantDataPoints += 1
+  return (stats, mirrored)
+
+# Expects a file with one edge path per line. If mirror is true, each path
+# and its mirror image (see SymmetricCountsForEdgePath) are counted as one.
+# Reading starts at the given byte offset (see LineCursor); returns the offset
+# where it stopped.
+def AddTextFileToPathStats(
+    filename, mirror=False, offset=0, completeOnly=False):
+  cursor = LineCursor(filename, offset, completeOnly)
+  for line in cursor:
+    pathStr = CleanEdgePath(line)
+    if len(pathStr) == 0:
+      continue
+    AddEdgePathToPathStats(pathStr, mirror)
+  return cursor.offset
+
+def PrintPathStatsSummary():
   paths = sorted(
-      allPathStats.values(), key=lambda ps: ps.dataPoints, reverse=True)
+      allPathStats, key=lambda ps: ps.dataPoints, reverse=True)
   print("All paths (" + str(len(paths)) + "):")
   for p in paths:
     print(p.pathStr + "," + str(p.dataPoints))
   minimalPaths = [
-      ps for ps in allPathStats.values() if ps.descendantDataPoints > 0]
+      ps for ps in allPathStats if ps.descendantDataPoints > 0]
   minimalPaths.sort(
       key=lambda ps: ps.dataPoints + ps.descendantDataPoints, reverse=True)
   print("Minimal paths (" + str(len(minimalPaths)) + "):")
   for p in minimalPaths:
     print(p.pathStr + "," + str(p.dataPoints + p.descendantDataPoints))
 
+def PathStatsForTextFile(filename):
+  AddTextFileToPathStats(filename)
+  PrintPathStatsSummary()
+
 # Expects a CSV whose first three columns are the x,y coords of the datapoint
-# and the path string that worked at those coords.
-# Outputs a CSV with the same datapoints (in unspecified order) and the
-# following columns:
+# and the path string that worked at those coords. If mirror is true, each
+# path and its mirror image are counted as one, with the coords of the
+# mirror's data points reflected to x -> 1 - x.
+# Reading starts at the given byte offset (see CsvPathRowReader); returns the
+# offset where it stopped.
+def AddCsvFileToPathStats(
+    filename, mirror=False, offset=0, completeOnly=False):
+  reader = CsvPathRowReader(filename, offset, completeOnly)
+  # edge path -> (PathStats, mirrored), skipping the count form and interner
+  # lookups for paths already seen in this file.
+  statsForEdgePath = {}
+  for (xs, ys, paths) in reader:
+    for i in range(len(paths)):
+      pathStr = paths[i]
+      entry = statsForEdgePath.get(pathStr)
+      if entry is None:
+        if len(statsForEdgePath) >= countsCacheLimit:
+          statsForEdgePath.clear()
+        entry = AddEdgePathToPathStats(pathStr, mirror)
+        statsForEdgePath[pathStr] = entry
+      else:
+        entry[0].dataPoints += 1
+        if entry[0].ancestor:
+          entry[0].ancestor.descendantDataPoints += 1
+      (stats, mirrored) = entry
+      stats.coords.add(1 - xs[i] if mirrored else xs[i], ys[i])
+  return reader.offset
+
+# Adds one x,y,path,... row; rows without a path (such as those of the fail
+# CSVs) are skipped.
+def AddCsvRowToPathStats(row, mirror=False):
+  if len(row) < 3:
+    return
+  try:
+    x = float(row[0])
+    y = float(row[1])
+  except:
+    return
+  pathStr = CleanEdgePath(row[2])
+  if len(pathStr) == 0:
+    return
+  (stats, mirrored) = AddEdgePathToPathStats(pathStr, mirror)
+  if mirrored:
+    x = 1 - x
+  stats.coords.add(x, y)
+
+# Outputs a CSV with every datapoint added so far (in unspecified order) and
+# the following columns:
 # x coord, y coord, path in fan-length form, fan count, flip count
-def PathStatsForCsvFile(filename):
-  with open(filename) as f:
-    reader = csv.reader(f)
-    for row in reader:
-      try:
-        x = float(row[0])
-        y = float(row[1])
-      except:
-        continue
-      # Because we accidentally printed a garbage trailing ')' at the end of the
-      # path in many data files >_<
-      pathStr = "".join([c for c in row[2] if c == 'L' or c == 'R'])
-      counts = CountsForEdgePath(pathStr)
-      cf = PathCountForm(counts)
-      stats = PathStats.statsForPath(cf)
-      stats.dataPoints += 1
-      stats.coordsList.append(Coords2d(x, y))
-      if stats.ancestor:
-        stats.ancestor.descendantDataPoints += 1
-  """
-      #minimalPaths[str(mf)] = 1
-  paths = sorted(
-      allPathStats.values(), key=lambda ps: ps.dataPoints, reverse=True)
-  print("All paths (" + str(len(paths)) + "):")
-  for p in paths:
-    print(p.pathStr + "," + str(p.dataPoints))
-  minimalPaths = [
-      ps for ps in allPathStats.values() if ps.descendantDataPoints > 0]
-  minimalPaths.sort(
-      key=lambda ps: ps.dataPoints + ps.descendantDataPoints, reverse=True)
-  print("Minimal paths (" + str(len(minimalPaths)) + "):")
-  for p in minimalPaths:
-    print(p.pathStr + "," + str(p.dataPoints + p.descendantDataPoints))
-  """
-  for k in allPathStats:
-    stats = allPathStats[k]
+def PrintPathStatsCsv():
+  for stats in allPathStats:
     pathStr = str(stats.path)
     fanCountStr = str(len(stats.path.counts))
     flipCountStr = str(stats.flipCount)
-    for coords in stats.coordsList:
-      print str(coords.x) + "," + str(coords.y) + "," + pathStr + \
-        "," + fanCountStr + "," + flipCountStr
+    for coords in stats.coords.points():
+      print(str(coords.x) + "," + str(coords.y) + "," + pathStr +
+        "," + fanCountStr + "," + flipCountStr)
+
+# Outputs a CSV with one row per path with data points and the following
+# columns:
+# path in fan-length form, data points, x min, y min, x max, y max,
+# centroid x, centroid y, convex hull of the data points as
+# counterclockwise "x y" vertices separated by ';'
+def PrintPathStatsCoordsSummary():
+  for stats in allPathStats:
+    coords = stats.coords
+    if coords.count == 0:
+      continue
+    centroid = coords.centroid()
+    columns = [
+        stats.pathStr, coords.count, coords.xMin, coords.yMin, coords.xMax,
+        coords.yMax, centroid.x, centroid.y]
+    hull = ";".join([str(x) + " " + str(y) for (x, y) in coords.hull])
+    print(",".join([str(c) for c in columns] + [hull]))
+
+def PathStatsForCsvFile(filename):
+  ResetPathStats(True)
+  AddCsvFileToPathStats(filename)
+  PrintPathStatsCsv()
 
-PathStatsForCsvFile("Data/pathlength-all.csv")
+if __name__ == "__main__":
+  PathStatsForCsvFile("Data/pathlength-all.csv")
@@ -0,0 +1,142 @@
+import json
+import os
+import zlib
+
+import billiards
+
+# Snapshots of the PathStats aggregates (billiards.allPathStats) on disk,
+# together with how far each input file has been read, so that new search
+# results can be folded in without rereading the old ones:
+#
+#   cp = LoadPathStatsCheckpoint("stats.json")  # or PathStatsCheckpoint()
+#   cp.addFile("Data/run7.success.csv")         # reads only the new bytes
+#   cp.save("stats.json")
+#
+# The snapshot is JSON with one entry per count form (its counts, data
+# points, descendant data points and coords summary; the ancestor link and
+# flip count are derived from the counts when loading) and one entry per
+# input file (the byte offset read up to and a checksum of the start of the
+# file, to notice files that were replaced rather than appended to). Every
+# data point is only saved if billiards.keepAllCoords was set, which is off by
+# default: the summaries stay the same size however many rows are added, so
+# saving and loading them doesn't slow down as the inputs grow.
+# Snapshots of disjoint inputs can be merged.
+
+checkpointVersion = 2
+# How many bytes at the start of each input file the recorded checksum covers.
+checksumBytes = 1 << 16
+
+def ChecksumForFile(filename, length):
+  with open(filename, "rb") as f:
+    return zlib.crc32(f.read(length)) & 0xffffffff
+
+def DataForCoordsSummary(coords):
+  if coords.count == 0:
+    return None
+  return {
+      "count": coords.count,
+      "box": [coords.xMin, coords.yMin, coords.xMax, coords.yMax],
+      "sum": [coords.xSum, coords.ySum],
+      "hull": [list(p) for p in coords.hull],
+      "sample": [list(p) for p in coords.sample],
+      "all": None if coords.all is None else coords.all.tolist()}
+
+def CoordsSummaryForData(data):
+  coords = billiards.CoordsSummary(data["all"] is not None)
+  coords.count = data["count"]
+  (coords.xMin, coords.yMin, coords.xMax, coords.yMax) = data["box"]
+  (coords.xSum, coords.ySum) = data["sum"]
+  coords.setHull([tuple(p) for p in data["hull"]])
+  coords.sample = [tuple(p) for p in data["sample"]]
+  if data["all"] is not None:
+    coords.all.extend(data["all"])
+  return coords
+
+class PathStatsCheckpoint:
+  def __init__(self, mirror=False):
+    self.mirror = mirror
+    # absolute filename -> {"offset", "checksumLength", "checksum"}
+    self.files = {}
+
+  # Adds the rows of filename that were appended since it was last added
+  # (all of them, the first time). A trailing partial row is left for the
+  # next call. Returns the number of bytes read.
+  def addFile(self, filename):
+    key = os.path.abspath(filename)
+    record = self.files.get(key)
+    offset = 0
+    if record is not None:
+      offset = record["offset"]
+      if os.path.getsize(filename) < offset or ChecksumForFile(
+          filename, record["checksumLength"]) != record["checksum"]:
+        raise ValueError(
+            filename + " changed since it was checkpointed; rebuild the "
+            "checkpoint without it")
+    if filename.endswith(".csv"):
+      end = billiards.AddCsvFileToPathStats(filename, self.mirror, offset, True)
+    else:
+      end = billiards.AddTextFileToPathStats(
+          filename, self.mirror, offset, True)
+    checksumLength = min(end, checksumBytes)
+    self.files[key] = {
+        "offset": end,
+        "checksumLength": checksumLength,
+        "checksum": ChecksumForFile(filename, checksumLength)}
+    return end - offset
+
+  # Adds the aggregates and file records of a snapshot to the current
+  # PathStats. Raises ValueError if the snapshot was taken with a different
+  # mirror setting or covers a file this checkpoint already covers.
+  def merge(self, data):
+    if data.get("version") != checkpointVersion:
+      raise ValueError("unsupported checkpoint version")
+    if data["mirror"] != self.mirror:
+      raise ValueError("can't merge checkpoints with different mirror settings")
+    if billiards.keepAllCoords and not data["keepCoords"]:
+      raise ValueError("checkpoint doesn't keep every data point")
+    for filename in data["files"]:
+      if filename in self.files:
+        raise ValueError(filename + " is in both checkpoints")
+    self.files.update(data["files"])
+    for entry in data["paths"]:
+      stats = billiards.PathStats.statsForPath(
+          billiards.PathCountForm(entry["counts"]))
+      stats.dataPoints += entry["dataPoints"]
+      stats.descendantDataPoints += entry["descendantDataPoints"]
+      if entry["coords"] is not None:
+        stats.coords.merge(CoordsSummaryForData(entry["coords"]))
+
+  def snapshot(self):
+    paths = []
+    for stats in billiards.allPathStats:
+      paths.append({
+          "counts": list(stats.path.counts),
+          "dataPoints": stats.dataPoints,
+          "descendantDataPoints": stats.descendantDataPoints,
+          "coords": DataForCoordsSummary(stats.coords)})
+    return {
+        "version": checkpointVersion,
+        "mirror": self.mirror,
+        "keepCoords": billiards.keepAllCoords,
+        "files": self.files,
+        "paths": paths}
+
+  # Writes the snapshot next to filename and renames it into place, so an
+  # interrupted save leaves the previous checkpoint intact.
+  def save(self, filename):
+    temporary = filename + ".tmp"
+    with open(temporary, "w") as f:
+      json.dump(self.snapshot(), f, separators=(",", ":"))
+    os.rename(temporary, filename)
+
+def ReadCheckpoint(filename):
+  with open(filename) as f:
+    return json.load(f)
+
+# Replaces the current PathStats with those of a checkpoint file.
+def LoadPathStatsCheckpoint(filename):
+  data = ReadCheckpoint(filename)
+  billiards.ResetPathStats(data["keepCoords"])
+  checkpoint = PathStatsCheckpoint(data["mirror"])
+  checkpoint.merge(data)
+  return checkpoint
@@ -0,0 +1,132 @@
+import math
+import random
+
+import billiards
+import probability
+
+# Coverage estimates for `billiards pointset search` results: streams the
+# success / fail CSVs written by SaveSearchResults (success rows are
+# x,y,path,pathLength,radius,log2Ratio and fail rows are x,y), bins the apexes
+# on a square grid and reports the success rate of each bin with exact
+# (Clopper-Pearson) and bootstrap confidence intervals, plus the share of all
+# apexes covered by each path family.
+#
+# Only per-bin and per-family counts are kept, so memory doesn't depend on the
+# number of rows.
+
+class CoverageCounts:
+  def __init__(self, binSize):
+    self.binSize = binSize
+    # (ix, iy) -> [trials, successes] for the bin
+    # [ix * binSize, (ix + 1) * binSize) x [iy * binSize, (iy + 1) * binSize)
+    self.bins = {}
+    # minimal count form string -> successes
+    self.familySuccesses = {}
+    self.trials = 0
+    self.successes = 0
+
+  # Reading starts at the given byte offset (see billiards.LineCursor);
+  # returns the offset where it stopped.
+  def addFile(self, filename, families=False, offset=0, completeOnly=False):
+    cursor = billiards.LineCursor(filename, offset, completeOnly)
+    for line in cursor:
+      self.addRow(line.split(","), families)
+    return cursor.offset
+
+  def addRow(self, fields, families=False):
+    try:
+      x = float(fields[0])
+      y = float(fields[1])
+    except:
+      return
+    success = len(fields) > 2
+    binSize = self.binSize
+    key = (int(math.floor(x / binSize)), int(math.floor(y / binSize)))
+    counts = self.bins.get(key)
+    if counts is None:
+      counts = [0, 0]
+      self.bins[key] = counts
+    counts[0] += 1
+    self.trials += 1
+    if success:
+      counts[1] += 1
+      self.successes += 1
+      if families:
+        self.addFamilySuccess(fields[2])
+
+  def addFamilySuccess(self, pathField):
+    edgePath = billiards.CleanEdgePath(pathField)
+    counts = billiards.CachedCountsForEdgePath(edgePath)
+    family = str(billiards.PathCountForm(counts).minimalAncestor())
+    self.familySuccesses[family] = self.familySuccesses.get(family, 0) + 1
+
+# Draws from Binomial(n, p). Counts the rarer outcome by summing geometric
+# waiting times, which takes O(n min(p, 1 - p)) steps; once the variance is
+# large enough that this would be slow, the normal approximation is already
+# indistinguishable at the resolution of a bootstrap.
+def BinomialSample(rng, n, p):
+  q = min(p, 1 - p)
+  if q <= 0:
+    count = 0
+  elif n * q * (1 - q) > 1000:
+    count = int(round(rng.gauss(n * q, math.sqrt(n * q * (1 - q)))))
+    count = min(max(count, 0), n)
+  else:
+    logMiss = math.log1p(-q)
+    count = 0
+    position = 0
+    while True:
+      position += int(math.log(1.0 - rng.random()) / logMiss) + 1
+      if position > n:
+        break
+      count += 1
+  return count if q == p else n - count
+
+# The bootstrap percentile interval for the success rate of a bin with the
+# given counts. Resampling the bin's rows with replacement is the same as
+# drawing its success count from Binomial(trials, successes / trials), so each
+# replicate costs one binomial draw instead of one draw per row.
+def BootstrapInterval(rng, trials, successes, replicates, confidence):
+  rate = successes / float(trials)
+  samples = sorted([
+      BinomialSample(rng, trials, rate) / float(trials)
+      for _ in range(replicates)])
+  tail = (1 - confidence) / 2
+  lowIndex = int(math.floor(tail * (replicates - 1)))
+  highIndex = int(math.ceil((1 - tail) * (replicates - 1)))
+  return (samples[lowIndex], samples[highIndex])
+
+# Prints one CSV row per bin:
+#   x min, y min, trials, successes, success rate, exact low, exact high,
+#   [bootstrap low, bootstrap high,] [P(>= successes | target rate)]
+# followed by a "total" row and, if family successes were collected, one
+# "family" row per path family with the share of all apexes it covers.
+def PrintCoverageReport(
+    coverage, confidence=0.95, replicates=200, targetRate=None, seed=0):
+  rng = random.Random(seed)
+  binSize = coverage.binSize
+
+  def rowForCounts(prefix, trials, successes):
+    (low, high) = probability.ConfidenceInterval(
+        trials, successes, confidence)
+    columns = prefix + [
+        trials, successes, successes / float(trials), low, high]
+    if replicates > 0:
+      columns.extend(BootstrapInterval(
+          rng, trials, successes, replicates, confidence))
+    if targetRate is not None:
+      columns.append(probability.SuccessProbability(
+          trials, successes, targetRate))
+    return ",".join([str(c) for c in columns])
+
+  for key in sorted(coverage.bins):
+    (trials, successes) = coverage.bins[key]
+    print(rowForCounts(
+        [key[0] * binSize, key[1] * binSize], trials, successes))
+  if coverage.trials > 0:
+    print(rowForCounts(
+        ["total", ""], coverage.trials, coverage.successes))
+    families = sorted(
+        coverage.familySuccesses.items(), key=lambda f: f[1], reverse=True)
+    for (family, successes) in families:
+      print(rowForCounts(["family", family], coverage.trials, successes))
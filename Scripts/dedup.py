@@ -0,0 +1,107 @@
+import heapq
+import os
+import shutil
+import tempfile
+
+# Exact distinct counts for corpora whose distinct keys (canonical paths,
+# count forms) don't fit in memory: keys are counted in an in-memory dict
+# until its estimated size passes the memory limit, then the dict is written
+# out sorted as a run file and cleared. Reading the results k-way merges the
+# runs (and whatever is still in memory), summing the counts of equal keys,
+# so memory stays bounded by the limit plus one buffered line per open run.
+#
+# Keys are strings without tabs or newlines.
+
+class ExternalCounter:
+  # Rough per-entry overhead of a dict entry holding a short string and an
+  # int, in bytes; only used to decide when to spill.
+  entryOverhead = 120
+
+  # memoryLimit: bytes of counts to keep in memory before spilling
+  # maxOpenRuns: the most run files merged at once; more are first merged
+  #   into larger runs
+  def __init__(self, memoryLimit=256 << 20, tempDir=None, maxOpenRuns=64):
+    self.memoryLimit = memoryLimit
+    self.maxOpenRuns = max(maxOpenRuns, 2)
+    self.counts = {}
+    self.memoryUsed = 0
+    self.runs = []
+    self.tempDir = tempfile.mkdtemp(prefix="dedup-", dir=tempDir)
+
+  def add(self, key, count=1):
+    previous = self.counts.get(key)
+    if previous is None:
+      self.counts[key] = count
+      self.memoryUsed += len(key) + ExternalCounter.entryOverhead
+      if self.memoryUsed >= self.memoryLimit:
+        self.spill()
+    else:
+      self.counts[key] = previous + count
+
+  def spill(self):
+    if len(self.counts) == 0:
+      return
+    self.runs.append(self.writeRun(sorted(self.counts.items())))
+    self.counts = {}
+    self.memoryUsed = 0
+
+  def writeRun(self, items):
+    (fd, filename) = tempfile.mkstemp(suffix=".run", dir=self.tempDir)
+    with os.fdopen(fd, "w") as f:
+      for (key, count) in items:
+        f.write(key + "\t" + str(count) + "\n")
+    return filename
+
+  @staticmethod
+  def readRun(filename):
+    with open(filename) as f:
+      for line in f:
+        (key, count) = line.rstrip("\n").split("\t")
+        yield (key, int(count))
+
+  # Yields (key, count) for every distinct key added so far, in sorted order
+  # of keys. Adding more keys afterwards is fine.
+  def items(self):
+    # Merge the oldest runs into one until they can all be open at once.
+    while len(self.runs) + 1 > self.maxOpenRuns:
+      group = self.runs[:self.maxOpenRuns]
+      merged = self.writeRun(
+          SumSortedCounts([ExternalCounter.readRun(run) for run in group]))
+      for run in group:
+        os.remove(run)
+      self.runs = [merged] + self.runs[self.maxOpenRuns:]
+    sources = [ExternalCounter.readRun(run) for run in self.runs]
+    sources.append(iter(sorted(self.counts.items())))
+    return SumSortedCounts(sources)
+
+  # Returns (distinct keys, total count).
+  def totals(self):
+    distinct = 0
+    total = 0
+    for (key, count) in self.items():
+      distinct += 1
+      total += count
+    return (distinct, total)
+
+  def __len__(self):
+    return self.totals()[0]
+
+  def close(self):
+    shutil.rmtree(self.tempDir, ignore_errors=True)
+    self.runs = []
+    self.counts = {}
+
+# Merges iterables of (key, count) sorted by key, yielding (key, total count)
+# once per distinct key.
+def SumSortedCounts(sources):
+  currentKey = None
+  currentCount = 0
+  for (key, count) in heapq.merge(*sources):
+    if key == currentKey:
+      currentCount += count
+    else:
+      if currentKey is not None:
+        yield (currentKey, currentCount)
+      (currentKey, currentCount) = (key, count)
+  if currentKey is not None:
+    yield (currentKey, currentCount)
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+
+import billiards
+import coverage
+import probability
+
+# Follows `billiards pointset search` result CSVs while the search is still
+# appending to them: each poll reads only the complete rows appended since the
+# previous poll and folds them into PathStats (billiards.allPathStats) and
+# coverage counts, and a short summary is published every so often. Success
+# and fail CSVs can be followed together, since rows are told apart by their
+# number of columns.
+#
+# This is a plain polling loop rather than an asyncio one, since these scripts
+# still run under Python 2; a poll of files that haven't grown costs one stat
+# call each.
+
+class SearchFollower:
+  def __init__(self, filenames, binSize=0.01, mirror=False):
+    self.filenames = filenames
+    self.mirror = mirror
+    # filename -> byte offset read up to
+    self.offsets = dict([(filename, 0) for filename in filenames])
+    self.coverage = coverage.CoverageCounts(binSize)
+    billiards.ResetPathStats(False)
+
+  # Reads what was appended to each file since the last poll, skipping files
+  # that don't exist yet. Returns the number of bytes read.
+  def poll(self):
+    read = 0
+    for filename in self.filenames:
+      if not os.path.exists(filename):
+        continue
+      offset = self.offsets[filename]
+      size = os.path.getsize(filename)
+      if size < offset:
+        raise ValueError(filename + " was truncated while being followed")
+      if size == offset:
+        continue
+      cursor = billiards.LineCursor(filename, offset, True)
+      for line in cursor:
+        fields = line.split(",")
+        self.coverage.addRow(fields)
+        billiards.AddCsvRowToPathStats(fields, self.mirror)
+      read += cursor.offset - offset
+      self.offsets[filename] = cursor.offset
+    return read
+
+  def summaryLines(self, top=10, confidence=0.95):
+    counts = self.coverage
+    lines = [
+        str(counts.trials) + " apexes, " + str(counts.successes) +
+        " successes"]
+    if counts.trials > 0:
+      (low, high) = probability.ConfidenceInterval(
+          counts.trials, counts.successes, confidence)
+      lines.append(
+          "success rate " + str(counts.successes / float(counts.trials)) +
+          " [" + str(low) + ", " + str(high) + "]")
+      (key, (trials, successes)) = min(
+          counts.bins.items(), key=lambda b: b[1][1] / float(b[1][0]))
+      lines.append(
+          "lowest bin rate " + str(successes / float(trials)) + " (" +
+          str(successes) + "/" + str(trials) + ") at " +
+          str(key[0] * counts.binSize) + "," + str(key[1] * counts.binSize))
+    paths = sorted(
+        billiards.allPathStats, key=lambda ps: ps.dataPoints, reverse=True)
+    families = [ps for ps in paths if ps.ancestor is None]
+    families.sort(
+        key=lambda ps: ps.dataPoints + ps.descendantDataPoints, reverse=True)
+    lines.append("paths (" + str(len(paths)) + "):")
+    for ps in paths[:top]:
+      lines.append(ps.pathStr + "," + str(ps.dataPoints))
+    lines.append("families (" + str(len(families)) + "):")
+    for ps in families[:top]:
+      lines.append(
+          ps.pathStr + "," + str(ps.dataPoints + ps.descendantDataPoints))
+    return lines
+
+  # Prints the summary, or writes it to filename; the file is replaced in one
+  # step, so anything watching it never sees a partial summary.
+  def publish(self, filename=None, top=10):
+    text = "\n".join(self.summaryLines(top)) + "\n"
+    if filename is None:
+      sys.stdout.write(text + "\n")
+      sys.stdout.flush()
+      return
+    temporary = filename + ".tmp"
+    with open(temporary, "w") as f:
+      f.write(text)
+    os.rename(temporary, filename)
+
+# Polls every interval seconds and publishes a summary at most every
+# publishInterval seconds, when something changed. Runs until interrupted, or
+# until the files haven't grown for idleExit seconds, publishing a final
+# summary.
+def Follow(
+    follower, interval=5.0, publishInterval=60.0, idleExit=None, output=None,
+    top=10):
+  lastPublish = None
+  lastGrowth = time.time()
+  changed = True
+  try:
+    while True:
+      now = time.time()
+      if follower.poll() > 0:
+        lastGrowth = now
+        changed = True
+      if idleExit is not None and now - lastGrowth >= idleExit:
+        break
+      if changed and (
+          lastPublish is None or now - lastPublish >= publishInterval):
+        follower.publish(output, top)
+        lastPublish = now
+        changed = False
+      time.sleep(interval)
+  except KeyboardInterrupt:
+    pass
+  if changed:
+    follower.publish(output, top)
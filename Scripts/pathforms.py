@@ -0,0 +1,127 @@
+import billiards
+
+# Conversions between the three forms of a path the Python and Swift tools
+# use, so results from both sides can be joined:
+#
+#   edge: an edge path, e.g. RRRLRRRLLLRLLL
+#   turns: the (singularity, degree) turns of a Swift TurnPath / TurnCycle
+#     (see billiards.EdgePathForTurns), written like TurnPath.Turn's
+#     description and separated by spaces, e.g. B0:2 B1:-2 B0:-2 B1:2
+#     (Swift's "[B0:2, B1:-2, ...]" is also accepted)
+#   counts: the count form of CountsForEdgePath, e.g. -2 -2 2 2, always
+#     taken from the canonical edge path so it can be converted back
+#
+# Everything converts through the edge path. A PathConverter remembers the
+# conversion of each distinct input, since search results repeat the same
+# paths over and over, so converting a whole corpus only pays once per
+# distinct path.
+
+forms = ["edge", "turns", "counts"]
+
+singularityNames = ["B0", "B1"]
+
+def TurnsString(turns):
+  return " ".join([
+      singularityNames[singularity] + ":" + str(degree)
+      for (singularity, degree) in turns])
+
+def TurnsForString(s):
+  turns = []
+  for token in s.replace("[", " ").replace("]", " ").replace(",", " ").split():
+    (name, degree) = token.split(":")
+    if name not in singularityNames:
+      raise ValueError("unknown singularity in turn " + token)
+    turns.append((singularityNames.index(name), int(degree)))
+  return turns
+
+def CountsString(counts):
+  return str(billiards.PathCountForm(counts))
+
+def CountsForString(s):
+  return [int(c) for c in s.split()]
+
+def EdgePathForString(s):
+  return billiards.CleanEdgePath(s)
+
+parsers = {
+    "edge": EdgePathForString,
+    "turns": TurnsForString,
+    "counts": CountsForString}
+
+formatters = {
+    "edge": lambda edgePath: edgePath,
+    "turns": TurnsString,
+    "counts": CountsString}
+
+def EdgePathForForm(form, value):
+  if form == "edge":
+    return value
+  if form == "turns":
+    return billiards.EdgePathForTurns(value)
+  return billiards.EdgePathForCounts(value)
+
+class PathConverter:
+  # canonical: whether to canonicalize edge paths before converting them to
+  #   the target form; count forms are always computed from the canonical
+  #   path, since which rotation of the counts CountsForEdgePath picks can
+  #   depend on where the edge path starts, and only the canonical one is
+  #   sure to convert back
+  def __init__(self, source, target, canonical=False):
+    if source not in forms or target not in forms:
+      raise ValueError("unknown path form")
+    self.source = source
+    self.target = target
+    self.canonical = canonical
+    # parsed input (as a hashable key) -> converted value
+    self.cache = {}
+    # parsed inputs with no path of the target form
+    self.failures = 0
+
+  # Converts one value of the source form, returning None if there is no
+  # such path (count forms no edge path has, turns that aren't a cycle, edge
+  # paths with no canonical start).
+  def convertOne(self, value):
+    key = value if isinstance(value, str) else tuple(value)
+    if key in self.cache:
+      return self.cache[key]
+    if len(self.cache) >= billiards.countsCacheLimit:
+      self.cache.clear()
+    try:
+      edgePath = EdgePathForForm(self.source, value)
+    except (ValueError, IndexError):
+      edgePath = None
+    if edgePath and (self.canonical or self.target == "counts"):
+      if len(billiards.CanonicalStartIndices(edgePath)) == 0:
+        edgePath = None
+      else:
+        edgePath = billiards.CanonicalizeEdgePath(edgePath)
+    if edgePath is None or len(edgePath) == 0:
+      result = None
+    elif self.target == "edge":
+      result = edgePath
+    elif self.target == "turns":
+      result = billiards.TurnsForEdgePath(edgePath)
+    else:
+      result = billiards.CachedCountsForEdgePath(edgePath)
+    self.cache[key] = result
+    return result
+
+  # Converts a whole list of values, with None for each one that has no
+  # path.
+  def convert(self, values):
+    results = [self.convertOne(value) for value in values]
+    self.failures += results.count(None)
+    return results
+
+  # Converts text, one path per string, yielding (input, output) strings;
+  # output is None when there is no path.
+  def convertStrings(self, strings):
+    parse = parsers[self.source]
+    format = formatters[self.target]
+    for s in strings:
+      result = self.convertOne(parse(s))
+      if result is None:
+        self.failures += 1
+        yield (s, None)
+      else:
+        yield (s, format(result))
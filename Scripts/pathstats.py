@@ -27,7 +27,7 @@ def WindingNumberForPath(p):
       high = position
     if position < low:
       low = position
-  return (position / 6, low, high)
+  return (position // 6, low, high)
 
 def Mod3(n):
   return ((n % 3) + 3) % 3
@@ -37,7 +37,7 @@ def SignForTurn(t):
     return -1
   if t == 'R':
     return 1
-  print "Invalid turn"
+  print("Invalid turn")
   sys.exit(1)
 
 def SignForIndex(n):
@@ -64,31 +64,45 @@ def CanonicalFormForPath(p):
   return rotations[0]
 
 
-totals = {}
-all_lows = {}
-all_highs = {}
-all_paths = {}
+# Accumulates winding number statistics for the edge paths in a file into
+# stats, which maps:
+#   "paths" -> {canonical path -> path count}, or a dedup.ExternalCounter
+#     for corpora whose distinct paths don't fit in memory
+#   "totals" -> {winding number -> path count}
+#   "lows", "highs" -> {winding number -> {low / high position -> path count}}
+def AddWindingStatsForFile(filename, stats):
+  totals = stats.setdefault("totals", {})
+  all_lows = stats.setdefault("lows", {})
+  all_highs = stats.setdefault("highs", {})
+  all_paths = stats.setdefault("paths", {})
+  with open(filename) as f:
+    for line in f:
+      #print ParityStringForPath(line.strip())
+      s = line.strip()
+      if len(s) > 0:
+        canonical = CanonicalFormForPath(s)
+        if isinstance(all_paths, dict):
+          all_paths[canonical] = all_paths.get(canonical, 0) + 1
+        else:
+          all_paths.add(canonical)
+        (w, low, high) = WindingNumberForPath(s)
+        totals[w] = totals.get(w, 0) + 1
+        lows = all_lows.get(w, {})
+        highs = all_highs.get(w, {})
+        lows[low] = lows.get(low, 0) + 1
+        highs[high] = highs.get(high, 0) + 1
+        all_lows[w] = lows
+        all_highs[w] = highs
+  return stats
 
-if len(sys.argv) < 2:
-  print "Expected path file"
-  sys.exit(1)
+def PrintWindingStats(stats):
+  print(str(len(stats["paths"])) + " distinct paths")
+  print(stats["totals"])
+  print(stats["lows"].get(0))
+  print(stats["highs"].get(0))
 
-with open(sys.argv[1]) as f:
-  for line in f.readlines():
-    #print ParityStringForPath(line.strip())
-    s = line.strip()
-    if len(s) > 0:
-      canonical = CanonicalFormForPath(s)
-      all_paths[canonical] = True
-      (w, low, high) = WindingNumberForPath(line.strip())
-      totals[w] = totals.get(w, 0) + 1
-      lows = all_lows.get(w, {})
-      highs = all_highs.get(w, {})
-      lows[low] = lows.get(low, 0) + 1
-      highs[high] = highs.get(high, 0) + 1
-      all_lows[w] = lows
-      all_highs[w] = highs
-  print str(len(all_paths)) + " distinct paths"
-  print totals
-  print all_lows[0]
-  print all_highs[0]
+if __name__ == "__main__":
+  if len(sys.argv) < 2:
+    print("Expected path file")
+    sys.exit(1)
+  PrintWindingStats(AddWindingStatsForFile(sys.argv[1], {}))
@@ -1,21 +1,188 @@
+import math
+from array import array
+
 def Choose(n, k):
   num = 1
   den = 1
   for i in range(k):
     num *= (n - i)
     den *= (k - i)
-  return num / den
+  return num // den
 
 # The probability of getting >= successCount successes out of trialCount trials
-# if the probability of success is p.
-def SuccessProbability(trialCount, successCount, p):
+# if the probability of success is p, summed term by term. This is only usable
+# for small trial counts (the terms underflow and the big-integer binomials get
+# slow in the hundreds of thousands); it's kept as a reference for
+# SuccessProbability.
+def DirectSuccessProbability(trialCount, successCount, p):
   probabilitySum = 0
   for i in range(successCount, trialCount+1):
-# Add the probability of 
+# Add the probability of
     probabilitySum += (
       Choose(trialCount, i) * (p ** i) * ((1-p) ** (trialCount-i)))
   return probabilitySum
 
-prob = SuccessProbability(2500, 2479, 0.98)
-print prob
-print (1-prob)
+def LogBeta(a, b):
+  return math.lgamma(a) + math.lgamma(b) - math.lgamma(a + b)
+
+# Evaluates the continued fraction for the incomplete beta function I_x(a, b)
+# by the modified Lentz method (see Numerical Recipes 6.4). It converges
+# quickly when x < (a + 1) / (a + b + 2), in O(sqrt(max(a, b))) iterations.
+def BetaContinuedFraction(a, b, x):
+  tiny = 1e-300
+  epsilon = 1e-16
+  maxIterations = 100 + int(10 * math.sqrt(max(a, b)))
+  c = 1.0
+  d = 1.0 - (a + b) * x / (a + 1)
+  if abs(d) < tiny:
+    d = tiny
+  d = 1.0 / d
+  h = d
+  for m in range(1, maxIterations + 1):
+    m2 = 2 * m
+    aa = m * (b - m) * x / ((a - 1 + m2) * (a + m2))
+    d = 1.0 + aa * d
+    if abs(d) < tiny:
+      d = tiny
+    c = 1.0 + aa / c
+    if abs(c) < tiny:
+      c = tiny
+    d = 1.0 / d
+    h *= d * c
+    aa = -(a + m) * (a + b + m) * x / ((a + m2) * (a + 1 + m2))
+    d = 1.0 + aa * d
+    if abs(d) < tiny:
+      d = tiny
+    c = 1.0 + aa / c
+    if abs(c) < tiny:
+      c = tiny
+    d = 1.0 / d
+    delta = d * c
+    h *= delta
+    if abs(delta - 1.0) < epsilon:
+      break
+  return h
+
+# Returns (log I_x(a, b), log (1 - I_x(a, b))) for the regularized incomplete
+# beta function. Whichever of the two is evaluated directly keeps full
+# relative precision even when it's far below the smallest float; the other
+# one is close to 1 and is derived from it.
+def LogIncompleteBeta(a, b, x):
+  if x <= 0:
+    return (float("-inf"), 0.0)
+  if x >= 1:
+    return (0.0, float("-inf"))
+  logFront = a * math.log(x) + b * math.log1p(-x) - LogBeta(a, b)
+  if x < (a + 1) / (a + b + 2.0):
+    logValue = logFront - math.log(a) + math.log(BetaContinuedFraction(a, b, x))
+    return (logValue, Log1mExp(logValue))
+  logComplement = (
+      logFront - math.log(b) + math.log(BetaContinuedFraction(b, a, 1 - x)))
+  return (Log1mExp(logComplement), logComplement)
+
+# log(1 - exp(v)) for v <= 0, without cancellation near either end.
+def Log1mExp(v):
+  if v == 0:
+    return float("-inf")
+  if v > -0.6931471805599453:
+    return math.log(-math.expm1(v))
+  return math.log1p(-math.exp(v))
+
+# Returns the log of the probability of getting >= successCount successes out
+# of trialCount trials, and the log of its complement (the probability of
+# getting < successCount successes), using
+#   P(X >= k) = I_p(k, n - k + 1).
+def LogSuccessProbabilities(trialCount, successCount, p):
+  if successCount <= 0:
+    return (0.0, float("-inf"))
+  if successCount > trialCount:
+    return (float("-inf"), 0.0)
+  return LogIncompleteBeta(
+      float(successCount), float(trialCount - successCount + 1), p)
+
+def LogSuccessProbability(trialCount, successCount, p):
+  return LogSuccessProbabilities(trialCount, successCount, p)[0]
+
+# The probability of getting >= successCount successes out of trialCount trials
+# if the probability of success is p.
+def SuccessProbability(trialCount, successCount, p):
+  return math.exp(LogSuccessProbability(trialCount, successCount, p))
+
+# The probability of getting < successCount successes, which (unlike
+# 1 - SuccessProbability) stays accurate when it is tiny.
+def FailureProbability(trialCount, successCount, p):
+  return math.exp(LogSuccessProbabilities(trialCount, successCount, p)[1])
+
+# Batched versions of the above over parallel sequences of trial counts,
+# success counts and probabilities. A scalar argument is used for every
+# element. Results are packed float64 arrays.
+def BroadcastArguments(*args):
+  length = 1
+  for arg in args:
+    if hasattr(arg, "__len__"):
+      length = len(arg)
+  return [arg if hasattr(arg, "__len__") else [arg] * length for arg in args]
+
+def LogSuccessProbabilityArray(trialCounts, successCounts, ps):
+  (trialCounts, successCounts, ps) = BroadcastArguments(
+      trialCounts, successCounts, ps)
+  return array('d', [
+      LogSuccessProbability(n, k, p)
+      for (n, k, p) in zip(trialCounts, successCounts, ps)])
+
+def SuccessProbabilityArray(trialCounts, successCounts, ps):
+  return array('d', [
+      math.exp(v)
+      for v in LogSuccessProbabilityArray(trialCounts, successCounts, ps)])
+
+# Returns the p in [0, 1] at which the monotone function f(p) crosses target,
+# by bisection. f must be increasing in p if increasing is true, decreasing
+# otherwise.
+def BisectProbability(f, target, increasing):
+  low = 0.0
+  high = 1.0
+  for _ in range(100):
+    mid = (low + high) / 2
+    if (f(mid) < target) == increasing:
+      low = mid
+    else:
+      high = mid
+    if high - low < 1e-15:
+      break
+  return (low + high) / 2
+
+# The Clopper-Pearson (exact) confidence interval for the success probability
+# given successCount successes out of trialCount trials. Returns (low, high).
+def ConfidenceInterval(trialCount, successCount, confidence=0.95):
+  logTail = math.log((1 - confidence) / 2)
+  if successCount <= 0:
+    low = 0.0
+  else:
+    # The p at which seeing at least this many successes has probability
+    # alpha / 2.
+    low = BisectProbability(
+        lambda p: LogSuccessProbabilities(trialCount, successCount, p)[0],
+        logTail, True)
+  if successCount >= trialCount:
+    high = 1.0
+  else:
+    # The p at which seeing at most this many successes has probability
+    # alpha / 2.
+    high = BisectProbability(
+        lambda p: LogSuccessProbabilities(trialCount, successCount + 1, p)[1],
+        logTail, False)
+  return (low, high)
+
+def ConfidenceIntervalArrays(trialCounts, successCounts, confidence=0.95):
+  lows = array('d')
+  highs = array('d')
+  for (n, k) in zip(trialCounts, successCounts):
+    (low, high) = ConfidenceInterval(n, k, confidence)
+    lows.append(low)
+    highs.append(high)
+  return (lows, highs)
+
+if __name__ == "__main__":
+  prob = SuccessProbability(2500, 2479, 0.98)
+  print(prob)
+  print(FailureProbability(2500, 2479, 0.98))
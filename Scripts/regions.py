@@ -0,0 +1,559 @@
+import math
+
+import billiards
+
+# Traces the boundaries of feasible regions -- the zero set of
+# PathStudy.fanFeasibilityMargin, or of a single constraint function -- as
+# polylines, instead of sampling the whole apex domain densely.
+#
+# Marching squares on a coarse grid finds every boundary curve that crosses
+# a grid edge; each crossing is then solved for along its edge, and the
+# polyline is refined by projecting segment midpoints back onto the curve
+# until it is within the tolerance everywhere.
+
+# Returns t in [0, 1] with f(a + t (b - a)) = 0 to within tolerance (in
+# distance), by the Illinois variant of false position, given the values fa
+# and fb at the endpoints, which must have different signs (as decided by
+# > 0).
+def SolveOnSegment(f, a, b, fa, fb, tolerance):
+  length = math.hypot(b[0] - a[0], b[1] - a[1])
+  (t0, t1) = (0.0, 1.0)
+  (v0, v1) = (fa, fb)
+  side = 0
+  for _ in range(100):
+    if (t1 - t0) * length <= tolerance:
+      break
+    if v0 != v1:
+      t = t1 - v1 * (t1 - t0) / (v1 - v0)
+    else:
+      t = (t0 + t1) / 2
+    # Keep at least a sliver of bisection so nonsmooth (min of several
+    # constraints) functions still converge.
+    margin = (t1 - t0) / 64
+    t = min(max(t, t0 + margin), t1 - margin)
+    v = f((a[0] + t * (b[0] - a[0]), a[1] + t * (b[1] - a[1])))
+    if (v > 0) == (v1 > 0):
+      (t1, v1) = (t, v)
+      if side == 1:
+        v0 /= 2
+      side = 1
+    else:
+      (t0, v0) = (t, v)
+      if side == -1:
+        v1 /= 2
+      side = -1
+  return (t0 + t1) / 2
+
+def PointOnSegment(a, b, t):
+  return (a[0] + t * (b[0] - a[0]), a[1] + t * (b[1] - a[1]))
+
+# Returns [(points, closed)] for the curves f = 0 in
+# region = (xmin, xmax, ymin, ymax), where points is a list of (x, y) and
+# closed says whether the polyline is a loop (then its last point is not
+# repeated). Curves are oriented with f > 0 on their left, so closed loops
+# around a region where f > 0 are counterclockwise and loops around holes
+# are clockwise. Curves that leave the region end at its boundary.
+#
+# steps is the number of grid cells along each axis. It only has to be fine
+# enough that no part of f > 0 or f <= 0 (including thin spikes of a region,
+# which feasible regions often taper into) slips between grid points without
+# changing the sign at any of them; the accuracy of the result comes from the
+# refinement, which keeps every point within tolerance of the curve and
+# every segment's midpoint within tolerance as well (up to maxDepth halvings
+# per grid segment).
+def TraceZeroSet(f, region, steps=64, tolerance=1e-6, maxDepth=10):
+  (xmin, xmax, ymin, ymax) = region
+  dx = (xmax - xmin) / float(steps)
+  dy = (ymax - ymin) / float(steps)
+
+  def gridPoint(i, j):
+    return (xmin + i * dx, ymin + j * dy)
+
+  values = [
+      [f(gridPoint(i, j)) for j in range(steps + 1)]
+      for i in range(steps + 1)]
+
+  # Edge ids: ("h", i, j) from grid point (i, j) to (i + 1, j), ("v", i, j)
+  # from (i, j) to (i, j + 1).
+  crossings = {}
+  def crossing(edge):
+    point = crossings.get(edge)
+    if point is None:
+      (kind, i, j) = edge
+      (i1, j1) = (i + 1, j) if kind == "h" else (i, j + 1)
+      (a, b) = (gridPoint(i, j), gridPoint(i1, j1))
+      t = SolveOnSegment(
+          f, a, b, values[i][j], values[i1][j1], tolerance)
+      point = PointOnSegment(a, b, t)
+      crossings[edge] = point
+    return point
+
+  # Marching squares: the segment leaving each edge crossing, by edge id.
+  nextEdge = {}
+  for i in range(steps):
+    for j in range(steps):
+      # The cell's corners and edges in counterclockwise order; edge k runs
+      # from corner k to corner k + 1.
+      corners = [(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1)]
+      edges = [("h", i, j), ("v", i + 1, j), ("h", i, j + 1), ("v", i, j)]
+      positive = [values[ci][cj] > 0 for (ci, cj) in corners]
+      # (edge index, entering): entering if f becomes positive there.
+      cellCrossings = [
+          (k, positive[(k + 1) % 4]) for k in range(4)
+          if positive[k] != positive[(k + 1) % 4]]
+      if len(cellCrossings) == 0:
+        continue
+      count = len(cellCrossings)
+      if count == 4:
+        center = (xmin + (i + 0.5) * dx, ymin + (j + 0.5) * dy)
+        centerPositive = f(center) > 0
+      else:
+        centerPositive = True
+      # Every segment runs from a crossing where f leaves the positive
+      # region to an entering one, so the positive side is on its left. It
+      # cuts off the negative corners between them, unless this is a saddle
+      # whose center is negative, where it cuts off the positive ones.
+      for index in range(count):
+        (k, entering) = cellCrossings[index]
+        if entering:
+          continue
+        offset = 1 if centerPositive else -1
+        (target, _) = cellCrossings[(index + offset) % count]
+        nextEdge[edges[k]] = edges[target]
+
+  # Chain the segments into polylines. Open chains start at an edge nothing
+  # leads into.
+  targets = set(nextEdge.values())
+  polylines = []
+  visited = set()
+  starts = [edge for edge in nextEdge if edge not in targets]
+  starts.extend([edge for edge in nextEdge if edge in targets])
+  for start in starts:
+    if start in visited:
+      continue
+    chain = [start]
+    visited.add(start)
+    edge = nextEdge.get(start)
+    closed = False
+    while edge is not None:
+      if edge == start:
+        closed = True
+        break
+      chain.append(edge)
+      visited.add(edge)
+      edge = nextEdge.get(edge)
+    points = [crossing(edge) for edge in chain]
+    polylines.append(
+        (RefinePolyline(f, points, closed, (dx, dy), tolerance, maxDepth),
+         closed))
+  return polylines
+
+# Inserts points between consecutive points of the polyline until the
+# midpoint of every segment is within tolerance of the curve f = 0. Each
+# midpoint is projected onto the nearest point of the curve along the
+# segment's normal, searching up to one grid cell (cellSize = (dx, dy)) away.
+def RefinePolyline(f, points, closed, cellSize, tolerance, maxDepth):
+  reach = math.hypot(cellSize[0], cellSize[1])
+
+  def project(p, q):
+    (mx, my) = ((p[0] + q[0]) / 2, (p[1] + q[1]) / 2)
+    (sx, sy) = (q[0] - p[0], q[1] - p[1])
+    length = math.hypot(sx, sy)
+    if length <= tolerance:
+      return None
+    # The left normal points into the positive side.
+    normal = (-sy / length, sx / length)
+    m = (mx, my)
+    fm = f(m)
+    direction = -1 if fm > 0 else 1
+    # Step outward with doubling steps, so the nearest crossing is found
+    # even where the region is thinner than the search reach.
+    near = m
+    fnear = fm
+    distance = min(length / 8, reach)
+    while True:
+      far = (mx + direction * distance * normal[0],
+             my + direction * distance * normal[1])
+      ffar = f(far)
+      if (ffar > 0) != (fm > 0):
+        break
+      if distance >= reach:
+        return None
+      (near, fnear) = (far, ffar)
+      distance = min(2 * distance, reach)
+    t = SolveOnSegment(f, near, far, fnear, ffar, tolerance)
+    r = PointOnSegment(near, far, t)
+    if math.hypot(r[0] - mx, r[1] - my) <= tolerance:
+      return None
+    return r
+
+  def refine(p, q, depth, result):
+    if depth < maxDepth:
+      r = project(p, q)
+      if r is not None:
+        refine(p, r, depth + 1, result)
+        result.append(r)
+        refine(r, q, depth + 1, result)
+
+  result = []
+  count = len(points)
+  for index in range(count):
+    p = points[index]
+    result.append(p)
+    if index + 1 < count:
+      refine(p, points[index + 1], 0, result)
+    elif closed and count > 1:
+      refine(p, points[0], 0, result)
+  return result
+
+def FeasibilityMarginFunction(study):
+  def margin(p):
+    return study.fanFeasibilityMargin(billiards.Coords2d(p[0], p[1]))[0]
+  return margin
+
+def ConstraintFunction(study, leftIndex, rightIndex):
+  def constraint(p):
+    apex = billiards.Coords2d(p[0], p[1])
+    return study.constraintFunctions(apex)(leftIndex, rightIndex)
+  return constraint
+
+# The boundary of the region where study is feasible, as TraceZeroSet
+# polylines.
+def FeasibleRegionBoundaries(study, region, steps=64, tolerance=1e-6):
+  return TraceZeroSet(
+      FeasibilityMarginFunction(study), region, steps, tolerance)
+
+# The zero set of constraintFunctions(apex)(leftIndex, rightIndex).
+def ConstraintBoundaries(
+    study, leftIndex, rightIndex, region, steps=64, tolerance=1e-6):
+  return TraceZeroSet(
+      ConstraintFunction(study, leftIndex, rightIndex), region, steps,
+      tolerance)
+
+# The position of a point on the boundary of region, as the distance from
+# (xmin, ymin) counterclockwise along the boundary.
+def PerimeterPosition(region, p):
+  (xmin, xmax, ymin, ymax) = region
+  (width, height) = (xmax - xmin, ymax - ymin)
+  distances = [abs(p[1] - ymin), abs(xmax - p[0]), abs(ymax - p[1]),
+      abs(p[0] - xmin)]
+  side = distances.index(min(distances))
+  if side == 0:
+    return p[0] - xmin
+  if side == 1:
+    return width + p[1] - ymin
+  if side == 2:
+    return width + height + xmax - p[0]
+  return 2 * width + height + ymax - p[1]
+
+# Turns TraceZeroSet curves into closed polygons of the part of region where
+# f > 0: each open curve ends on the boundary of region with the positive
+# side on its left, i.e. counterclockwise along the boundary from its end,
+# so it is joined to the next curve starting counterclockwise from there,
+# passing the corners of region in between. If no curve reaches the
+# boundary, the boundary itself is a polygon iff f > 0 on it, which
+# cornerPositive (whether f > 0 at (xmin, ymin)) decides. Returns
+# [points].
+def ClosePolylines(curves, region, cornerPositive):
+  (xmin, xmax, ymin, ymax) = region
+  (width, height) = (xmax - xmin, ymax - ymin)
+  perimeter = 2 * (width + height)
+  corners = [
+      (width, (xmax, ymin)), (width + height, (xmax, ymax)),
+      (2 * width + height, (xmin, ymax)), (perimeter, (xmin, ymin))]
+
+  polygons = [points for (points, closed) in curves if closed]
+  openCurves = [points for (points, closed) in curves if not closed]
+  if len(openCurves) == 0:
+    if cornerPositive:
+      polygons.append(
+          [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)])
+    return polygons
+
+  starts = [PerimeterPosition(region, points[0]) for points in openCurves]
+  used = [False] * len(openCurves)
+  for first in range(len(openCurves)):
+    if used[first]:
+      continue
+    polygon = []
+    index = first
+    while not used[index]:
+      used[index] = True
+      points = openCurves[index]
+      polygon.extend(points)
+      end = PerimeterPosition(region, points[-1])
+      # The next start counterclockwise from this end.
+      index = min(
+          range(len(openCurves)),
+          key=lambda i: (starts[i] - end) % perimeter)
+      distance = (starts[index] - end) % perimeter
+      for (position, corner) in corners + [
+          (c + perimeter, p) for (c, p) in corners]:
+        if end < position < end + distance:
+          polygon.append(corner)
+    polygons.append(polygon)
+  return polygons
+
+# The closed polygons of the part of region where f > 0 (see
+# ClosePolylines).
+def RegionPolygons(f, region, steps=64, tolerance=1e-6):
+  curves = TraceZeroSet(f, region, steps, tolerance)
+  return ClosePolylines(curves, region, f((region[0], region[2])) > 0)
+
+# The signed area of a closed polygon (positive if counterclockwise).
+def PolygonArea(points):
+  area = 0.0
+  count = len(points)
+  for index in range(count):
+    (x0, y0) = points[index]
+    (x1, y1) = points[(index + 1) % count]
+    area += x0 * y1 - x1 * y0
+  return area / 2
+
+# Yields the (column, row) of every cell of a grid with square cells of side
+# cellSize (and a cell corner at the origin) that the segment from a to b
+# passes through, in order (Amanatides and Woo).
+def SegmentCells(a, b, cellSize):
+  (x0, y0) = (a[0] / cellSize, a[1] / cellSize)
+  (x1, y1) = (b[0] / cellSize, b[1] / cellSize)
+  (i, j) = (int(math.floor(x0)), int(math.floor(y0)))
+  (iEnd, jEnd) = (int(math.floor(x1)), int(math.floor(y1)))
+  (dx, dy) = (x1 - x0, y1 - y0)
+  stepI = 1 if dx > 0 else -1
+  stepJ = 1 if dy > 0 else -1
+  if dx != 0:
+    tMaxI = ((i + (1 if dx > 0 else 0)) - x0) / dx
+    tDeltaI = 1 / abs(dx)
+  else:
+    (tMaxI, tDeltaI) = (float("inf"), float("inf"))
+  if dy != 0:
+    tMaxJ = ((j + (1 if dy > 0 else 0)) - y0) / dy
+    tDeltaJ = 1 / abs(dy)
+  else:
+    (tMaxJ, tDeltaJ) = (float("inf"), float("inf"))
+  yield (i, j)
+  for _ in range(abs(iEnd - i) + abs(jEnd - j)):
+    if tMaxI < tMaxJ:
+      i += stepI
+      tMaxI += tDeltaI
+    else:
+      j += stepJ
+      tMaxJ += tDeltaJ
+    yield (i, j)
+
+# The union of feasible regions over the obtuse apex domain (the upper half
+# of the disk of radius 1/2 around (1/2, 0), where `billiards pointset
+# search` samples), clipped to a box, on a grid of square cells.
+#
+# Each region is rasterized on its own with a scanline sweep: its edges are
+# bucketed by the cell rows whose center line they cross, and the spans of
+# nonzero winding number along each row are filled in one slice. A cell is
+# only counted as covered if its center is inside some region and no edge
+# of that region passes through it, so covered cells really are covered;
+# cells some region's boundary passes through are kept apart as undecided,
+# and cells that are neither are really uncovered. Memory and time per
+# region are proportional to its edges and the rows it spans, and nothing
+# is kept per region, so tens of thousands of regions are fine.
+class RegionUnion:
+  # box: (xmin, xmax, ymin, ymax); cellSize: the side of a grid cell.
+  def __init__(self, cellSize, box=(0.0, 1.0, 0.0, 0.5)):
+    (xmin, xmax, ymin, ymax) = box
+    self.cellSize = cellSize
+    self.box = box
+    self.columns = int(math.ceil((xmax - xmin) / cellSize))
+    self.rows = int(math.ceil((ymax - ymin) / cellSize))
+    cellCount = self.columns * self.rows
+    self.covered = bytearray(cellCount)
+    self.undecided = bytearray(cellCount)
+    self.regionCount = 0
+    # 1 for cells entirely inside the domain, 2 for cells on its rim. Along
+    # a row the domain is an interval of x, narrowest at the row's top edge
+    # and widest at its bottom edge.
+    self.domain = bytearray(cellCount)
+    for row in range(self.rows):
+      (bottom, top) = (ymin + row * cellSize, ymin + (row + 1) * cellSize)
+      if top <= 0:
+        continue
+      for (y, value) in [(max(bottom, 0.0), 2), (top, 1)]:
+        if value == 1 and bottom <= 0:
+          continue
+        halfWidth = math.sqrt(max(0.25 - y * y, 0.0))
+        if value == 1:
+          first = int(math.ceil((0.5 - halfWidth - xmin) / cellSize))
+          last = int(math.floor((0.5 + halfWidth - xmin) / cellSize))
+        else:
+          first = int(math.floor((0.5 - halfWidth - xmin) / cellSize))
+          last = int(math.ceil((0.5 + halfWidth - xmin) / cellSize))
+        (first, last) = (max(first, 0), min(last, self.columns))
+        if first < last:
+          base = row * self.columns
+          self.domain[base + first:base + last] = (
+              bytearray([value]) * (last - first))
+
+  # Adds one region, given as closed polygons (lists of (x, y) with the last
+  # point joined to the first) combined by the nonzero winding rule, as
+  # from ClosePolylines.
+  def addRegion(self, polygons):
+    (xmin, xmax, ymin, ymax) = self.box
+    (columns, rows, h) = (self.columns, self.rows, self.cellSize)
+    self.regionCount += 1
+    boundaryColumns = {}
+    rowCrossings = {}
+    for polygon in polygons:
+      count = len(polygon)
+      for index in range(count):
+        (x0, y0) = polygon[index]
+        (x1, y1) = polygon[(index + 1) % count]
+        (a, b) = ((x0 - xmin, y0 - ymin), (x1 - xmin, y1 - ymin))
+        for (column, row) in SegmentCells(a, b, h):
+          if 0 <= row < rows and 0 <= column < columns:
+            boundaryColumns.setdefault(row, set()).add(column)
+        if a[1] == b[1]:
+          continue
+        # The rows whose center line is in [min y, max y).
+        direction = 1 if b[1] > a[1] else -1
+        (low, high) = (min(a[1], b[1]), max(a[1], b[1]))
+        firstRow = max(int(math.ceil(low / h - 0.5)), 0)
+        lastRow = min(int(math.ceil(high / h - 0.5)), rows)
+        for row in range(firstRow, lastRow):
+          yc = (row + 0.5) * h
+          x = a[0] + (yc - a[1]) * (b[0] - a[0]) / (b[1] - a[1])
+          rowCrossings.setdefault(row, []).append((x, direction))
+
+    ones = b"\x01" * columns
+    for (row, crossings) in rowCrossings.items():
+      crossings.sort()
+      skip = sorted(boundaryColumns.get(row, ()))
+      base = row * columns
+      winding = 0
+      for index in range(len(crossings) - 1):
+        winding += crossings[index][1]
+        if winding == 0:
+          continue
+        # The cells whose centers are in [x, next x).
+        first = max(int(math.ceil(crossings[index][0] / h - 0.5)), 0)
+        last = min(
+            int(math.ceil(crossings[index + 1][0] / h - 0.5)), columns)
+        start = first
+        for column in skip:
+          if first <= column < last:
+            if start < column:
+              self.covered[base + start:base + column] = ones[:column - start]
+            start = column + 1
+        if start < last:
+          self.covered[base + start:base + last] = ones[:last - start]
+    for (row, boundary) in boundaryColumns.items():
+      for column in boundary:
+        self.undecided[row * columns + column] = 1
+
+  # Returns (domain area, covered area, (uncovered area low, high)) within
+  # the box: the covered area is a lower bound, and the uncovered area lies
+  # between the bounds (rim and undecided cells count toward the upper one
+  # only).
+  def areas(self):
+    cellArea = self.cellSize * self.cellSize
+    covered = 0
+    uncovered = 0
+    undecided = 0
+    for index in range(len(self.domain)):
+      domain = self.domain[index]
+      if domain == 0:
+        continue
+      if self.covered[index]:
+        if domain == 1:
+          covered += 1
+      elif domain == 1 and not self.undecided[index]:
+        uncovered += 1
+      else:
+        undecided += 1
+    return (self.domainArea(), covered * cellArea,
+        (uncovered * cellArea, (uncovered + undecided) * cellArea))
+
+  # The area of the domain within the box, by the midpoint rule over x (the
+  # height of the domain is continuous in x, so this converges quickly).
+  def domainArea(self, samples=100000):
+    (xmin, xmax, ymin, ymax) = self.box
+    (xmin, xmax) = (max(xmin, 0.0), min(xmax, 1.0))
+    if xmax <= xmin:
+      return 0.0
+    width = (xmax - xmin) / samples
+    area = 0.0
+    for index in range(samples):
+      x = xmin + (index + 0.5) * width
+      top = min(ymax, math.sqrt(max(0.25 - (x - 0.5) * (x - 0.5), 0.0)))
+      area += max(top - max(ymin, 0.0), 0.0)
+    return area * width
+
+  # Returns the connected (sharing a cell side) components of uncovered
+  # cells, largest first, as (cell count, area, (xmin, xmax, ymin, ymax),
+  # (x, y)), where (x, y) is the center of the component's cell nearest to
+  # its centroid: a good apex to search next.
+  def uncoveredComponents(self):
+    (columns, rows, h) = (self.columns, self.rows, self.cellSize)
+    (xmin, ymin) = (self.box[0], self.box[2])
+    seen = bytearray(len(self.domain))
+    components = []
+    for startIndex in range(len(self.domain)):
+      if seen[startIndex] or not self.isUncovered(startIndex):
+        continue
+      seen[startIndex] = 1
+      stack = [startIndex]
+      cells = []
+      while len(stack) > 0:
+        index = stack.pop()
+        cells.append(index)
+        (row, column) = divmod(index, columns)
+        neighbors = []
+        if column > 0:
+          neighbors.append(index - 1)
+        if column + 1 < columns:
+          neighbors.append(index + 1)
+        if row > 0:
+          neighbors.append(index - columns)
+        if row + 1 < rows:
+          neighbors.append(index + columns)
+        for neighbor in neighbors:
+          if not seen[neighbor] and self.isUncovered(neighbor):
+            seen[neighbor] = 1
+            stack.append(neighbor)
+      cellRows = [index // columns for index in cells]
+      cellColumns = [index % columns for index in cells]
+      meanRow = sum(cellRows) / float(len(cells))
+      meanColumn = sum(cellColumns) / float(len(cells))
+      center = min(
+          cells, key=lambda index: (index // columns - meanRow) ** 2 +
+              (index % columns - meanColumn) ** 2)
+      components.append((
+          len(cells), len(cells) * h * h,
+          (xmin + min(cellColumns) * h, xmin + (max(cellColumns) + 1) * h,
+           ymin + min(cellRows) * h, ymin + (max(cellRows) + 1) * h),
+          (xmin + (center % columns + 0.5) * h,
+           ymin + (center // columns + 0.5) * h)))
+    components.sort(key=lambda c: c[0], reverse=True)
+    return components
+
+  def isUncovered(self, index):
+    return (self.domain[index] == 1 and not self.covered[index] and
+        not self.undecided[index])
+
+# Reads polygons from `analyze.py trace --closed` output (path,curve,x,y
+# rows) and yields (path, [polygon]) for each path.
+def RegionsInFile(filename):
+  path = None
+  polygons = []
+  curve = None
+  with open(filename) as f:
+    for line in f:
+      fields = line.strip().split(",")
+      if len(fields) < 4:
+        continue
+      if fields[0] != path:
+        if path is not None:
+          yield (path, polygons)
+        (path, polygons, curve) = (fields[0], [], None)
+      if fields[1] != curve:
+        curve = fields[1]
+        polygons.append([])
+      polygons[-1].append((float(fields[2]), float(fields[3])))
+  if path is not None:
+    yield (path, polygons)
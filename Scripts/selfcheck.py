@@ -0,0 +1,160 @@
+import sys
+
+import billiards
+
+# Checks the equivalences the other scripts rely on, on a fixed set of paths,
+# so a change that breaks one fails here instead of silently skewing results:
+#
+#   mirror: a path is feasible at (x, y) exactly when its mirror is feasible
+#     at (1 - x, y) (analyze.py constraint-sweep --mirror, coverage.py)
+#   fan: fanFeasibilityMargin is feasibilityMargin divided by the positive
+#     factor (norm0^maxAngles[0] * norm1^maxAngles[1])^2
+#   forms: turns, edge and count forms convert back to the same path
+#     (pathforms.py)
+#   packed: a PackedEdgePath behaves like its string
+#   scan: ScanEdgePath's chunk table matches scanning one turn at a time
+#
+# Usage: python selfcheck.py
+# Prints one line per failure and exits with status 1 if there were any.
+
+# Corpus paths (from pathlength-all) of a few lengths, with mirrors that
+# differ from them.
+checkPaths = [
+    "RRRRRRRRRLRRRLLLLLLLLLRLLL",
+    "RRRRRLRRRLLLLLRLLL",
+    "RRRRRRRRRRRRRLRRRRRLLLLLLLLLLLLLRLLLLL",
+    "RRRRRRRRRRRRRRRLRRRLLLLLLLLLLLLLLLRLLL",
+    "RRRRRRRRRRRLRRRLLLLLLLLLLLRLLL",
+    "RRRRRRRRRLRRRRRRRLLLLLLLLLRLLLLLLL",
+]
+
+# Apexes with x >= 1/2, so 1 - x is exact and the mirrored apex is exactly
+# the reflection. Every mirror above is feasible at one of the first six,
+# so signs of both kinds are compared.
+checkApexes = [
+    (0.7, 0.225), (0.55, 0.3), (0.725, 0.15), (0.825, 0.15), (0.775, 0.2),
+    (0.5625, 0.175), (0.5, 0.4), (0.6, 0.2), (0.75, 0.1), (0.9, 0.2),
+]
+
+# Fan and ring margins below this are rounding noise, whose ratio means
+# nothing.
+marginNoise = 1e-9
+ratioTolerance = 1e-6
+
+failures = []
+# How many feasible (path, apex) pairs CheckMirror saw.
+feasibleCount = [0]
+
+def Check(condition, name, detail):
+  if not condition:
+    failures.append(name + ": " + detail)
+
+def CheckMirror(path):
+  mirror = billiards.MirrorEdgePath(path)
+  canonical = billiards.CanonicalizeEdgePath(path)
+  Check(billiards.MirrorEdgePath(mirror) == canonical, "mirror",
+      "mirror of the mirror of " + path + " isn't its canonical path")
+  (symmetric, mirrored) = billiards.SymmetricCanonicalEdgePath(path)
+  Check(symmetric == (mirror if mirrored else canonical), "mirror",
+      "SymmetricCanonicalEdgePath(" + path + ") is neither form")
+  study = billiards.PathStudy(path)
+  mirrorStudy = billiards.PathStudy(mirror)
+  for (x, y) in checkApexes:
+    for (p, a, b) in [(path, study, mirrorStudy), (mirror, mirrorStudy, study)]:
+      sign = a.feasibilitySign(billiards.Coords2d(x, y))
+      mirrorSign = b.feasibilitySign(billiards.Coords2d(1 - x, y))
+      Check(sign == mirrorSign, "mirror",
+          "%s at (%r, %r) has sign %d, its mirror %d" % (
+              p, x, y, sign, mirrorSign))
+      if sign > 0:
+        feasibleCount[0] += 1
+
+def CheckFanMargin(path):
+  study = billiards.PathStudy(path)
+  for (x, y) in checkApexes:
+    apex = billiards.Coords2d(x, y)
+    ring = study.feasibilityMargin(apex)[0]
+    fan = study.fanFeasibilityMargin(apex)[0]
+    if abs(ring) < marginNoise and abs(fan) < marginNoise:
+      continue
+    norms = billiards.PathPowerTable(apex).norms
+    factor = (norms[0] ** study.maxAngles[0] *
+        norms[1] ** study.maxAngles[1]) ** 2
+    ratio = fan * factor / ring
+    Check(abs(ratio - 1) < ratioTolerance, "fan",
+        "%s at (%r, %r): fan margin %r, ring margin %r, ratio %r" % (
+            path, x, y, fan, ring, ratio))
+
+def CheckForms(path):
+  canonical = billiards.CanonicalizeEdgePath(path)
+  turns = billiards.TurnsForEdgePath(canonical)
+  turnsPath = billiards.CanonicalizeEdgePath(billiards.EdgePathForTurns(turns))
+  Check(turnsPath == canonical, "forms",
+      "turns of " + path + " convert back to " + turnsPath)
+  counts = billiards.CountsForEdgePath(canonical)
+  countsPath = billiards.EdgePathForCounts(counts)
+  Check(
+      countsPath is not None and
+          billiards.CountsForEdgePath(countsPath) == counts,
+      "forms",
+      "counts %r of %s convert back to %r" % (counts, path, countsPath))
+
+def CheckPacked(path):
+  packed = billiards.PackedEdgePath.fromString(path)
+  mirror = billiards.MirrorEdgePath(path)
+  Check(str(packed) == path, "packed", "str of packed " + path)
+  Check(len(packed) == len(path) and list(packed) == list(path), "packed",
+      "turns of packed " + path)
+  for (start, stop) in [(0, 8), (3, 17), (5, len(path)), (9, 9)]:
+    Check(str(packed[start:stop]) == path[start:stop], "packed",
+        "slice [%d:%d] of %s" % (start, stop, path))
+  for offset in [1, 8, len(path) - 1]:
+    Check(str(packed.rotated(offset)) == path[offset:] + path[:offset],
+        "packed", "rotation by %d of %s" % (offset, path))
+  Check(str(billiards.MirrorEdgePath(packed)) == mirror, "packed",
+      "mirror of packed " + path)
+  Check(str(billiards.CanonicalizeEdgePath(packed)) ==
+      billiards.CanonicalizeEdgePath(path), "packed",
+      "canonical form of packed " + path)
+  packedMirror = billiards.PackedEdgePath.fromString(mirror)
+  Check((packed < packedMirror) == (path < mirror) and
+      (packed == packedMirror) == (path == mirror), "packed",
+      "order of packed " + path + " and its mirror")
+
+def CheckPackedPaths():
+  paths = checkPaths + [billiards.MirrorEdgePath(p) for p in checkPaths] + [""]
+  packedPaths = billiards.PackedEdgePaths()
+  for path in paths:
+    packedPaths.append(path)
+  Check([str(p) for p in packedPaths] == paths, "packed",
+      "PackedEdgePaths doesn't return the paths appended")
+
+def CheckScan(path):
+  (state, canonicalStarts, fanStarts) = billiards.ScanChunk(
+      billiards.ScanState(0, 1, path[-1]), path)
+  expected = (list(canonicalStarts), list(fanStarts))
+  Check(billiards.ScanEdgePath(path) == expected, "scan",
+      "chunked scan of " + path)
+  Check(billiards.ScanEdgePath(
+      billiards.PackedEdgePath.fromString(path)) == expected, "scan",
+      "packed scan of " + path)
+
+def RunChecks():
+  for path in checkPaths:
+    CheckMirror(path)
+    for p in [path, billiards.MirrorEdgePath(path)]:
+      CheckFanMargin(p)
+      CheckForms(p)
+      CheckPacked(p)
+      CheckScan(p)
+  CheckPackedPaths()
+  Check(feasibleCount[0] > 0, "mirror",
+      "no path is feasible at any apex, so no feasible sign was compared")
+
+if __name__ == "__main__":
+  RunChecks()
+  for failure in failures:
+    print(failure)
+  if failures:
+    sys.exit(1)
+  print("all checks passed")
@@ -0,0 +1,205 @@
+import os
+import re
+import sqlite3
+
+import billiards
+import checkpoint
+import pathstats
+
+# A SQLite database of search results, for ad-hoc queries such as
+#
+#   SELECT x, y FROM apexPaths WHERE flipCount >= 4
+#
+# It has one row per apex in the success / fail CSVs and one row per distinct
+# count form with its computed properties:
+#
+#   paths: id, countForm, ancestor (its minimal count form), edgePath (the
+#     canonical edge path of the first data point seen with it), length,
+#     fanCount, flipCount, windingNumber, spineCount, boundarySpineCount,
+#     maxAngle0, maxAngle1
+#   apexes: x, y, pathId (NULL for fail rows), pathLength, radius, log2Ratio
+#     (the remaining success CSV columns, when present), fileId
+#   files: id, name, offset, checksumLength, checksum (how far each input
+#     file was ingested; see checkpoint.PathStatsCheckpoint)
+#   apexPaths: a view joining each apex with the properties of its path
+#
+# Files are ingested in batches, one transaction per batch together with the
+# file's new offset, so an interrupted ingestion resumes where the last
+# committed batch stopped, and files that have grown since are ingested
+# incrementally.
+
+schema = [
+    """CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        offset INTEGER NOT NULL,
+        checksumLength INTEGER NOT NULL,
+        checksum INTEGER NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS paths (
+        id INTEGER PRIMARY KEY,
+        countForm TEXT UNIQUE NOT NULL,
+        ancestor TEXT NOT NULL,
+        edgePath TEXT NOT NULL,
+        length INTEGER NOT NULL,
+        fanCount INTEGER NOT NULL,
+        flipCount INTEGER NOT NULL,
+        windingNumber INTEGER NOT NULL,
+        spineCount INTEGER NOT NULL,
+        boundarySpineCount INTEGER NOT NULL,
+        maxAngle0 INTEGER NOT NULL,
+        maxAngle1 INTEGER NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS apexes (
+        x REAL NOT NULL,
+        y REAL NOT NULL,
+        pathId INTEGER REFERENCES paths(id),
+        pathLength INTEGER,
+        radius REAL,
+        log2Ratio REAL,
+        fileId INTEGER NOT NULL REFERENCES files(id))""",
+    """CREATE VIEW IF NOT EXISTS apexPaths AS
+        SELECT apexes.*, paths.* FROM apexes JOIN paths
+        ON apexes.pathId = paths.id"""]
+
+# Created after ingesting rather than before, since maintaining them row by
+# row would slow down bulk loads.
+indexes = [
+    "CREATE INDEX IF NOT EXISTS apexesByPath ON apexes(pathId)",
+    "CREATE INDEX IF NOT EXISTS apexesByCoords ON apexes(x, y)",
+    "CREATE INDEX IF NOT EXISTS pathsByAncestor ON paths(ancestor)",
+    "CREATE INDEX IF NOT EXISTS pathsByFanCount ON paths(fanCount)",
+    "CREATE INDEX IF NOT EXISTS pathsByFlipCount ON paths(flipCount)",
+    "CREATE INDEX IF NOT EXISTS pathsByWindingNumber ON paths(windingNumber)"]
+
+# Because we accidentally printed a garbage trailing ')' at the end of the
+# path in many data files >_<
+nonTurnPattern = re.compile("[^LR]")
+
+def ParseOptional(parse, fields, i):
+  try:
+    return parse(fields[i])
+  except (IndexError, ValueError):
+    return None
+
+class PathStore:
+  def __init__(self, filename):
+    self.connection = sqlite3.connect(filename)
+    self.connection.execute("PRAGMA journal_mode = WAL")
+    self.connection.execute("PRAGMA synchronous = NORMAL")
+    with self.connection:
+      for statement in schema:
+        self.connection.execute(statement)
+    # edge path -> paths.id
+    self.pathIds = {}
+
+  def close(self):
+    self.connection.close()
+
+  # Returns the id of the path with the count form of edgePath, adding a row
+  # with its properties if it is new.
+  def pathIdForEdgePath(self, edgePath):
+    pathId = self.pathIds.get(edgePath)
+    if pathId is not None:
+      return pathId
+    if len(self.pathIds) >= billiards.countsCacheLimit:
+      self.pathIds.clear()
+    counts = billiards.CachedCountsForEdgePath(edgePath)
+    countForm = billiards.PathCountForm(counts)
+    row = self.connection.execute(
+        "SELECT id FROM paths WHERE countForm = ?",
+        (str(countForm),)).fetchone()
+    if row is not None:
+      pathId = row[0]
+    else:
+      canonical = billiards.CanonicalizeEdgePath(edgePath)
+      spineCounts = billiards.SpineCountsForEdgePath(canonical)
+      maxAngles = billiards.MaxAnglesForEdgePath(canonical)
+      pathId = self.connection.execute(
+          "INSERT INTO paths (countForm, ancestor, edgePath, length, "
+          "fanCount, flipCount, windingNumber, spineCount, "
+          "boundarySpineCount, maxAngle0, maxAngle1) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+          (str(countForm), str(countForm.minimalAncestor()), canonical,
+           len(canonical), len(counts), billiards.FlipCountForCounts(counts),
+           pathstats.WindingNumberForPath(canonical)[0], spineCounts[0],
+           spineCounts[1], maxAngles[0], maxAngles[1])).lastrowid
+    self.pathIds[edgePath] = pathId
+    return pathId
+
+  # Returns the apexes row for one line of a success / fail CSV, or None if
+  # it has no numeric coords.
+  def rowForLine(self, line, fileId):
+    fields = line.split(",")
+    try:
+      x = float(fields[0])
+      y = float(fields[1])
+    except (IndexError, ValueError):
+      return None
+    pathId = None
+    if len(fields) > 2:
+      edgePath = nonTurnPattern.sub("", fields[2])
+      if len(edgePath) > 0:
+        pathId = self.pathIdForEdgePath(edgePath)
+    return (
+        x, y, pathId, ParseOptional(int, fields, 3),
+        ParseOptional(float, fields, 4), ParseOptional(float, fields, 5),
+        fileId)
+
+  # Adds the rows appended to filename since it was last ingested (all of
+  # them, the first time), batchSize rows per transaction. A trailing partial
+  # row is left for the next call. Returns the number of rows added.
+  def ingestFile(self, filename, batchSize=100000):
+    name = os.path.abspath(filename)
+    row = self.connection.execute(
+        "SELECT id, offset, checksumLength, checksum FROM files "
+        "WHERE name = ?", (name,)).fetchone()
+    if row is None:
+      with self.connection:
+        fileId = self.connection.execute(
+            "INSERT INTO files (name, offset, checksumLength, checksum) "
+            "VALUES (?, 0, 0, ?)",
+            (name, checkpoint.ChecksumForFile(filename, 0))).lastrowid
+      offset = 0
+    else:
+      (fileId, offset, checksumLength, checksum) = row
+      if os.path.getsize(filename) < offset or checkpoint.ChecksumForFile(
+          filename, checksumLength) != checksum:
+        raise ValueError(
+            filename + " changed since it was ingested; delete its rows to "
+            "ingest it again")
+    cursor = billiards.LineCursor(filename, offset, True)
+    added = 0
+    batch = []
+    for line in cursor:
+      apexRow = self.rowForLine(line, fileId)
+      if apexRow is not None:
+        batch.append(apexRow)
+      if len(batch) >= batchSize:
+        added += self.commitBatch(filename, fileId, batch, cursor.offset)
+        batch = []
+    added += self.commitBatch(filename, fileId, batch, cursor.offset)
+    return added
+
+  # New paths were inserted outside of a transaction block, so they are
+  # committed along with the batch that first used them.
+  def commitBatch(self, filename, fileId, batch, offset):
+    checksumLength = min(offset, checkpoint.checksumBytes)
+    with self.connection:
+      self.connection.executemany(
+          "INSERT INTO apexes VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+      self.connection.execute(
+          "UPDATE files SET offset = ?, checksumLength = ?, checksum = ? "
+          "WHERE id = ?",
+          (offset, checksumLength,
+           checkpoint.ChecksumForFile(filename, checksumLength), fileId))
+    return len(batch)
+
+  def createIndexes(self):
+    with self.connection:
+      for statement in indexes:
+        self.connection.execute(statement)
+      self.connection.execute("ANALYZE")
+
+  # Returns (column names, row iterator) for an SQL query.
+  def query(self, sql, parameters=()):
+    cursor = self.connection.execute(sql, parameters)
+    return ([d[0] for d in cursor.description], cursor)
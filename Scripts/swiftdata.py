@@ -0,0 +1,187 @@
+from __future__ import division
+
+import codecs
+import fractions
+import json
+import os
+import sys
+from array import array
+
+import billiards
+
+# Readers for the point sets and cycle sets the Swift DataManager saves under
+# its root directory (./data for the billiards command):
+#
+#   pointset/<name>/elements.json: [{"x": "3/8", "y": "1/5"}, ...]
+#   pointset/<name>/metadata.json: {"count": ..., "density": ..., ...}
+#   cycleset/<name>/elements.json: [{"id": 0, "cycle": {"turns": [
+#       {"degree": 2, "singularity": "B0"}, ...]}, "metadata": {
+#       "feasiblePoint": {"x": ..., "y": ...}, "apexBounds": ..., ...}}, ...]
+#
+# GmpRational values are strings "p/q", or "p" for integers. The element
+# arrays are parsed one element at a time rather than as one document, so a
+# million-element set costs its float arrays (16 bytes per point, plus 8 for
+# its file offset) rather than a few hundred bytes of Python objects per
+# element, and cycle sets can be streamed without keeping anything. Exact
+# values are reread from the file on demand.
+
+# Bytes read from an elements file at a time.
+chunkSize = 1 << 20
+
+def FloatForRational(s):
+  (numerator, slash, denominator) = s.partition("/")
+  if slash:
+    # Correctly rounded, even when numerator or denominator don't fit in a
+    # float.
+    return int(numerator) / int(denominator)
+  return float(int(numerator))
+
+def FractionForRational(s):
+  return fractions.Fraction(s)
+
+# Under Python 2 the decoder works on the undecoded bytes, so offsets into the
+# buffer are already byte offsets.
+def Utf8Decoder():
+  if sys.version_info[0] >= 3:
+    return codecs.getincrementaldecoder("utf-8")()
+  return None
+
+def Utf8Length(s):
+  if sys.version_info[0] >= 3:
+    return len(s.encode("utf-8"))
+  return len(s)
+
+# Yields (byte offset, decoded element) for each element of the JSON array in
+# filename, starting at the element at offset (the start of the array if 0).
+def JsonArrayElements(filename, offset=0):
+  decoder = json.JSONDecoder()
+  textDecoder = Utf8Decoder()
+  with open(filename, "rb") as f:
+    f.seek(offset)
+    buffer = ""
+    index = 0
+    # The byte offset of buffer[index].
+    position = offset
+    atEnd = False
+    opened = offset != 0
+    while True:
+      # Skip to the start of the next element.
+      while index < len(buffer) and buffer[index] in " \t\r\n,":
+        index += 1
+        position += 1
+      if index < len(buffer) and not opened:
+        if buffer[index] != "[":
+          raise ValueError(filename + " isn't a JSON array")
+        opened = True
+        index += 1
+        position += 1
+        continue
+      if index < len(buffer) and buffer[index] == "]":
+        return
+      element = None
+      if index < len(buffer):
+        try:
+          (element, end) = decoder.raw_decode(buffer, index)
+        except ValueError:
+          element = None
+        # A number cut off by the end of the buffer would still decode.
+        if element is not None and end == len(buffer) and not atEnd:
+          element = None
+      if element is not None:
+        yield (position, element)
+        position += Utf8Length(buffer[index:end])
+        index = end
+        continue
+      if atEnd:
+        if index < len(buffer):
+          raise ValueError(
+              filename + ": malformed element at byte " + str(position))
+        return
+      data = f.read(chunkSize)
+      atEnd = len(data) == 0
+      if textDecoder is not None:
+        data = textDecoder.decode(data, atEnd)
+      buffer = buffer[index:] + data
+      index = 0
+
+def JsonArrayElementAt(filename, offset):
+  for (elementOffset, element) in JsonArrayElements(filename, offset):
+    return element
+  raise ValueError(filename + ": no element at byte " + str(offset))
+
+# Accepts either an elements.json file or the set directory containing it.
+def ElementsFilename(path):
+  if os.path.isdir(path):
+    return os.path.join(path, "elements.json")
+  return path
+
+class PointSet:
+  def __init__(self, path):
+    self.filename = ElementsFilename(path)
+    self.metadata = None
+    metadataFilename = os.path.join(
+        os.path.dirname(self.filename), "metadata.json")
+    if os.path.exists(metadataFilename):
+      with open(metadataFilename) as f:
+        self.metadata = json.load(f)
+    self.xs = array("d")
+    self.ys = array("d")
+    self.offsets = array("l")
+    for (offset, point) in JsonArrayElements(self.filename):
+      self.xs.append(FloatForRational(point["x"]))
+      self.ys.append(FloatForRational(point["y"]))
+      self.offsets.append(offset)
+
+  def __len__(self):
+    return len(self.xs)
+
+  def point(self, i):
+    return billiards.Coords2d(self.xs[i], self.ys[i])
+
+  # The exact coordinates of point i, as Fractions.
+  def exactPoint(self, i):
+    point = JsonArrayElementAt(self.filename, self.offsets[i])
+    return billiards.Coords2d(
+        FractionForRational(point["x"]), FractionForRational(point["y"]))
+
+# Yields (x, y) for each point of a point set without keeping any of them.
+def PointSetCoords(path):
+  for (offset, point) in JsonArrayElements(ElementsFilename(path)):
+    yield (FloatForRational(point["x"]), FloatForRational(point["y"]))
+
+singularityIndices = {"B0": 0, "B1": 1}
+
+class SwiftCycle:
+  def __init__(self, element):
+    self.id = element["id"]
+    # (singularity, degree) pairs, see billiards.EdgePathForTurns
+    self.turns = [
+        (singularityIndices[turn["singularity"]], turn["degree"])
+        for turn in element["cycle"]["turns"]]
+    # The rest of the metadata (apexBounds, cotangentBounds, angleRatio)
+    # is left as read, with rationals as strings.
+    self.metadata = element["metadata"]
+    self.edgePath = None
+
+  def feasiblePoint(self):
+    point = self.metadata["feasiblePoint"]
+    return billiards.Coords2d(
+        FloatForRational(point["x"]), FloatForRational(point["y"]))
+
+  def exactFeasiblePoint(self):
+    point = self.metadata["feasiblePoint"]
+    return billiards.Coords2d(
+        FractionForRational(point["x"]), FractionForRational(point["y"]))
+
+  def edgePathStr(self):
+    if self.edgePath is None:
+      self.edgePath = billiards.EdgePathForTurns(self.turns)
+    return self.edgePath
+
+  def study(self):
+    return billiards.PathStudy(self.edgePathStr())
+
+# Yields a SwiftCycle for each element of a cycle set, one at a time.
+def CycleSetCycles(path):
+  for (offset, element) in JsonArrayElements(ElementsFilename(path)):
+    yield SwiftCycle(element)